@@ -1,27 +1,172 @@
+import socket
+import ssl
+import struct
+import threading
 import time
+import zlib
 from deluge_client import DelugeRPCClient
-from deluge_client.client import DelugeClientException
+from deluge_client.client import DelugeClientException, ConnectionLostException, CallTimeoutException, \
+    InvalidHeaderException, RemoteException, RPC_RESPONSE, RPC_ERROR, MESSAGE_HEADER_SIZE
+from deluge_client.rencode import loads
 from ..torrent import Torrent
 from ..clientstatus import ClientStatus
 from ..torrentstatus import TorrentStatus
 from ..exception.loginfailure import LoginFailure
+from ..exception.nosuchtorrent import NoSuchTorrent
 from ..exception.remotefailure import RemoteFailure
 
 # Default port of Delgue
 DEFAULT_PORT = 58846
 
+# A connection to Deluge, which is shared by the tasks on the same daemon
+# The torrent cache is shared as well, since the daemon tracks the differences of torrents for each session
+#
+# The calls are pipelined with the internals of deluge-client (the socket, request ids and message format),
+# which is why its version is pinned in setup.py
+class DelugeConnection(object):
+    # Size of each read from the socket
+    READ_SIZE = 65536
+
+    # Open connections (keyed by host, port, username and password)
+    _connections = {}
+    # Locks of connecting to each daemon (with the same keys),
+    # so a slow daemon doesn't hold back the logins to the others
+    _connecting_locks = {}
+    _connections_lock = threading.Lock()
+
+    def __init__(self, client):
+        # RPC Client
+        self.client = client
+        # Only one thread can use the socket at a time
+        self.lock = threading.RLock()
+        # Torrent Properties Cache
+        self.torrent_cache = {}
+        # Torrent objects built from the cache
+        self.torrent_objects = {}
+        # Last Time of Refreshing Cache
+        self.last_refresh = 0
+        # Whether the plugin 'label' is enabled
+        self.label_enabled = None
+
+    # Get the connection to the daemon, and connect if it isn't open
+    @staticmethod
+    def get(host, port, username, password):
+        key = (host, port, username, password)
+        with DelugeConnection._connections_lock:
+            connecting_lock = DelugeConnection._connecting_locks.setdefault(key, threading.Lock())
+        # The tasks on the same daemon wait for the first one to connect
+        with connecting_lock:
+            with DelugeConnection._connections_lock:
+                if key in DelugeConnection._connections:
+                    return DelugeConnection._connections[key]
+            client = DelugeRPCClient(host, port, username, password, decode_utf8 = True)
+            client.connect()
+            connection = DelugeConnection(client)
+            with DelugeConnection._connections_lock:
+                DelugeConnection._connections[key] = connection
+            return connection
+
+    # Drop the connection if it's broken, so the next login connects again
+    def _evict(self):
+        with DelugeConnection._connections_lock:
+            for key, connection in list(DelugeConnection._connections.items()):
+                if connection is self:
+                    del DelugeConnection._connections[key]
+
+    # Receive some data from the socket
+    def _receive_data(self):
+        try:
+            data = self.client._socket.recv(DelugeConnection.READ_SIZE)
+        except ssl.SSLError:
+            raise CallTimeoutException()
+        if len(data) == 0:
+            raise ConnectionLostException()
+        return data
+
+    # Receive a message from the socket
+    # Returns the message and the data received after it
+    def _receive_message(self, data):
+        if self.client.deluge_version == 2:
+            while len(data) < MESSAGE_HEADER_SIZE:
+                data += self._receive_data()
+            # The first byte is 'D' before the protocol versions were introduced, or the protocol version
+            expected = b'D'[0] if self.client.deluge_protocol_version is None else self.client.deluge_protocol_version
+            if bytearray(data[:1])[0] != expected:
+                raise InvalidHeaderException('Expected %r as first byte in reply' % expected)
+            length = struct.unpack('!i' if self.client.deluge_protocol_version is None else '!I',
+                data[1:MESSAGE_HEADER_SIZE])[0]
+            data = data[MESSAGE_HEADER_SIZE:]
+            while len(data) < length:
+                data += self._receive_data()
+            message, data = zlib.decompress(data[:length]), data[length:]
+        else: # Deluge 1.x doesn't send the length, so we decompress the data until the stream ends
+            decompressor = zlib.decompressobj()
+            message = decompressor.decompress(data)
+            while not decompressor.eof:
+                message += decompressor.decompress(self._receive_data())
+            data = decompressor.unused_data
+        return (list(loads(message, decode_utf8 = True)), data)
+
+    # Make the exception of an error response
+    def _remote_exception(self, error):
+        if self.client.deluge_version == 2:
+            exception_type, exception_msg = error[0], ', '.join(error[1])
+        else:
+            exception_type, exception_msg = error[0][0], error[0][1]
+        return RemoteException(exception_msg if len(exception_msg) > 0 else exception_type)
+
+    # Send all the calls before receiving their responses
+    def _pipeline(self, calls):
+        results = {}
+        for method, args in calls:
+            self.client._send_call(self.client.deluge_version, self.client.deluge_protocol_version, method, *args)
+            results[self.client.request_id] = None
+        request_ids = list(results)
+        pending = set(request_ids)
+        data = b''
+        while len(pending) > 0:
+            message, data = self._receive_message(data)
+            # Events are not requested by us
+            if message[1] not in pending:
+                continue
+            if message[0] == RPC_RESPONSE:
+                results[message[1]] = message[2]
+            elif message[0] == RPC_ERROR:
+                results[message[1]] = self._remote_exception(message[2:])
+            pending.remove(message[1])
+        return [results[request_id] for request_id in request_ids]
+
+    # Call the methods with pipelining
+    # Each call is a tuple of the method and its arguments
+    # Returns the results in order, where a failed call is replaced by its exception
+    def call_many(self, calls):
+        with self.lock:
+            try:
+                try:
+                    return self._pipeline(calls)
+                except (socket.error, ConnectionLostException, CallTimeoutException, InvalidHeaderException):
+                    # The responses left in the socket can't be told apart, so we reconnect and try again
+                    self.client.reconnect()
+                    return self._pipeline(calls)
+            except (socket.error, DelugeClientException):
+                self._evict()
+                raise
+
 class Deluge(object):
+    # Requests are sent in one connection
+    support_concurrent_requests = False
+    # The torrents are built from the torrent cache without any requests
+    requests_per_torrent = False
+    # Torrents can be filtered by the daemon
+    support_server_filters = True
+
     def __init__(self, host):
         # Host
         self._host = host
+        # Connection to Deluge
+        self._connection = None
         # RPC Client
         self._client = None
-        # Torrent Properties Cache
-        self._torrent_cache = {}
-        # Cache Valid Time
-        self._refresh_expire_time = 30
-        # Last Time of Refreshing Cache
-        self._last_refresh = 0
 
     # Login to Deluge
     def login(self, username, password):
@@ -30,42 +175,56 @@ class Deluge(object):
         host = splits[0] if len(splits) > 0 else ''
         port = int(splits[1]) if len(splits) > 1 else DEFAULT_PORT
 
-        # Create RPC client and connect to Deluge
-        self._client = DelugeRPCClient(host, port, username, password, decode_utf8 = True)
+        # Connect to Deluge, or reuse the connection
         try:
-            self._client.connect()
+            self._connection = DelugeConnection.get(host, port, username, password)
+            self._client = self._connection.client
         except DelugeClientException as e:
             # Display class name of the exception if there is no error messages
             raise LoginFailure(e.args[0].split('\n')[0] if len(e.args) > 0 else e.__class__.__name__)
 
     # A caller to call deluge api; includes exception processing
-    def _call(self, method, *args, **kwargs):
+    def _call(self, method, *args):
+        result = self._call_many([(method, args)])[0]
+        if isinstance(result, RemoteFailure):
+            raise result
+        return result
+
+    # Call deluge api in a pipeline
+    # Returns the results, where a failed call is replaced by a RemoteFailure
+    def _call_many(self, calls):
         try:
-            return self._client.call(method, *args, **kwargs)
-        except DelugeClientException as e:
-            # Raise our own exception
-            raise RemoteFailure(e.args[0].split('\n')[0] if len(e.args) > 0 else e.__class__.__name__)
+            results = self._connection.call_many(calls)
+        except (socket.error, DelugeClientException) as e:
+            raise Deluge._remote_failure(e)
+        return [Deluge._remote_failure(result) if isinstance(result, DelugeClientException) else result
+            for result in results]
+
+    # Convert the exception to our own exception
+    @staticmethod
+    def _remote_failure(e):
+        # Display class name of the exception if there is no error messages
+        return RemoteFailure(str(e.args[0]).split('\n')[0] if len(e.args) > 0 else e.__class__.__name__)
 
     # Get client status
+    # The status is requested when it's used for the first time
     def client_status(self):
-        cs = ClientStatus()
+        return ClientStatus(self._session_status, self.remote_free_space)
 
-        # Set remote free space checker
-        cs.free_space = self.remote_free_space
-
-        # Get DL/UL information
+    # Get DL/UL information
+    def _session_status(self):
         session_stats = self._call('core.get_session_status', [
             'payload_download_rate',
             'payload_upload_rate',
             'total_download',
             'total_upload',
         ])
-        cs.download_speed = session_stats['payload_download_rate']
-        cs.total_downloaded = session_stats['total_download']
-        cs.upload_speed = session_stats['payload_upload_rate']
-        cs.total_uploaded = session_stats['total_upload']
-
-        return cs
+        return {
+            'download_speed': session_stats['payload_download_rate'],
+            'total_downloaded': session_stats['total_download'],
+            'upload_speed': session_stats['payload_upload_rate'],
+            'total_uploaded': session_stats['total_upload'],
+        }
 
     # Get Deluge version
     def version(self):
@@ -81,77 +240,153 @@ class Deluge(object):
         # Returns the protocol version
         return self._client.deluge_protocol_version if self._client.deluge_protocol_version is not None else 'not provided'
 
+    # Keys of Deluge to build each torrent attribute
+    _key_map = {
+        'hash': ['hash'],
+        'name': ['name'],
+        'category': ['label'], # Available when the plugin 'label' is enabled
+        'tracker': ['trackers'],
+        'status': ['state'],
+        'size': ['total_size'],
+        'ratio': ['ratio'],
+        'uploaded': ['total_uploaded'],
+        'downloaded': ['all_time_download'],
+        'create_time': ['time_added'],
+        'seeding_time': ['seeding_time'],
+        'upload_speed': ['upload_payload_rate'],
+        'download_speed': ['download_payload_rate'],
+        'seeder': ['total_seeds'],
+        'connected_seeder': ['num_seeds'],
+        'leecher': ['total_peers'],
+        'connected_leecher': ['num_peers'],
+        'average_upload_speed': ['total_uploaded', 'active_time'],
+        'average_download_speed': ['all_time_download', 'active_time', 'finished_time'],
+        'last_activity': ['time_since_transfer'],
+        'progress': ['progress'],
+    }
+
+    # Deluge states of each torrent status
+    _state_map = {
+        TorrentStatus.Checking: ['Checking'],
+        TorrentStatus.Downloading: ['Downloading'],
+        TorrentStatus.Error: ['Error'],
+        TorrentStatus.Paused: ['Paused'],
+        TorrentStatus.Queued: ['Queued'],
+        TorrentStatus.Uploading: ['Seeding'],
+        TorrentStatus.Unknown: ['Allocating', 'Moving'],
+    }
+
+    # Make the filter dict of the daemon from the accepted values of the torrent attributes
+    def _filter_dict(self, filters):
+        filter_dict = {}
+        if 'status' in filters:
+            states = set()
+            for status in filters['status']:
+                states.update(Deluge._state_map.get(status, []))
+            filter_dict['state'] = sorted(states)
+        if 'category' in filters:
+            # Labels can't be filtered unless the plugin is enabled
+            if self._connection.label_enabled is None:
+                self._connection.label_enabled = 'Label' in self._call('core.get_enabled_plugins')
+            if self._connection.label_enabled:
+                filter_dict['label'] = sorted(filters['category'])
+        return filter_dict
+
     # Get torrent list
-    def torrents_list(self):
+    # Only the specified torrent attributes will be requested,
+    # and only the torrents with the accepted values (if specified) will be listed
+    def torrents_list(self, fields=None, filters=None):
+        # The cache may be shared with other tasks
+        with self._connection.lock:
+            return self._refresh_torrents(fields, filters)
+
+    # Refresh the torrent cache and get torrent list
+    def _refresh_torrents(self, fields, filters):
         # Save hashes
         torrents_hash = []
+        # Decide the keys to request
+        keys = set()
+        for attr in Deluge._key_map:
+            if fields is None or attr in fields:
+                keys.update(Deluge._key_map[attr])
+        filter_dict = self._filter_dict(filters) if filters is not None else {}
         # Get torrent list (and their properties)
-        torrent_list = self._call('core.get_torrents_status', {}, [
-            'active_time',
-            'all_time_download',
-            'download_payload_rate',
-            'finished_time',
-            'hash',
-            'label', # Available when the plugin 'label' is enabled
-            'name',
-            'num_peers',
-            'num_seeds',
-            'progress',
-            'ratio',
-            'seeding_time',
-            'state',
-            'time_added',
-            'time_since_transfer',
-            'total_peers',
-            'total_seeds',
-            'total_size',
-            'total_uploaded',
-            'trackers',
-            'upload_payload_rate',
-        ])
-        # Save properties to cache
-        self._torrent_cache = torrent_list
-        self._last_refresh = time.time()
-        # Return torrent hashes
-        for h in torrent_list:
+        # With diff enabled, only the properties changed since the last call in this session are returned
+        torrent_list = self._call('core.get_torrents_status', filter_dict, sorted(keys), True)
+        # Merge the changes into the cache
+        # The cache is used as a snapshot until the next call of this method
+        for h, changes in torrent_list.items():
+            torrent = self._connection.torrent_cache.setdefault(h, {})
+            if len(changes) > 0:
+                torrent.update(changes)
+                self._connection.torrent_objects.pop(h, None) # Rebuild the torrent object
             torrents_hash.append(h)
+        self._connection.last_refresh = time.time()
+        # Remove the torrents that no longer exist
+        # The torrents out of the filter are kept, since their differences are still tracked by the daemon
+        if len(filter_dict) == 0:
+            for removed_hash in set(self._connection.torrent_cache).difference(torrent_list):
+                del self._connection.torrent_cache[removed_hash]
+                self._connection.torrent_objects.pop(removed_hash, None)
         return torrents_hash
 
     # Get Torrent Properties
     def torrent_properties(self, torrent_hash):
-        # Check cache expiration
-        if time.time() - self._last_refresh > self._refresh_expire_time:
+        # Check whether the cache exists
+        if self._connection.last_refresh == 0:
             self.torrents_list()
+        if torrent_hash not in self._connection.torrent_cache:
+            raise NoSuchTorrent("No such torrent of hash '%s'." % torrent_hash)
+        # Reuse the torrent object if the torrent hasn't changed
+        if torrent_hash in self._connection.torrent_objects:
+            return self._connection.torrent_objects[torrent_hash]
         # Extract properties
-        torrent = self._torrent_cache[torrent_hash]
-        # Create torrent object
+        torrent = self._connection.torrent_cache[torrent_hash]
+        # Create torrent object with the provided keys
         torrent_obj = Torrent()
+        self._connection.torrent_objects[torrent_hash] = torrent_obj
         torrent_obj.hash = torrent['hash']
         torrent_obj.name = torrent['name']
         if 'label' in torrent:
             torrent_obj.category = [torrent['label']] if len(torrent['label']) > 0 else []
-        torrent_obj.tracker = [tracker['url'] for tracker in torrent['trackers']]
-        torrent_obj.status = Deluge._judge_status(torrent['state'])
-        torrent_obj.size = torrent['total_size']
-        torrent_obj.ratio = torrent['ratio']
-        torrent_obj.uploaded = torrent['total_uploaded']
-        torrent_obj.downloaded = torrent['all_time_download']
-        torrent_obj.create_time = int(torrent['time_added'])
-        torrent_obj.seeding_time = torrent['seeding_time']
-        torrent_obj.upload_speed = torrent['upload_payload_rate']
-        torrent_obj.download_speed = torrent['download_payload_rate']
-        torrent_obj.seeder = torrent['total_seeds']
-        torrent_obj.connected_seeder = torrent['num_seeds']
-        torrent_obj.leecher = torrent['total_peers']
-        torrent_obj.connected_leecher = torrent['num_peers']
-        torrent_obj.average_upload_speed = torrent['total_uploaded'] / torrent['active_time'] if torrent['active_time'] > 0 else 0
-        if 'finished_time' in torrent:
+        if 'trackers' in torrent:
+            torrent_obj.tracker = [tracker['url'] for tracker in torrent['trackers']]
+        if 'state' in torrent:
+            torrent_obj.status = Deluge._judge_status(torrent['state'])
+        if 'total_size' in torrent:
+            torrent_obj.size = torrent['total_size']
+        if 'ratio' in torrent:
+            torrent_obj.ratio = torrent['ratio']
+        if 'total_uploaded' in torrent:
+            torrent_obj.uploaded = torrent['total_uploaded']
+        if 'all_time_download' in torrent:
+            torrent_obj.downloaded = torrent['all_time_download']
+        if 'time_added' in torrent:
+            torrent_obj.create_time = int(torrent['time_added'])
+        if 'seeding_time' in torrent:
+            torrent_obj.seeding_time = torrent['seeding_time']
+        if 'upload_payload_rate' in torrent:
+            torrent_obj.upload_speed = torrent['upload_payload_rate']
+        if 'download_payload_rate' in torrent:
+            torrent_obj.download_speed = torrent['download_payload_rate']
+        if 'total_seeds' in torrent:
+            torrent_obj.seeder = torrent['total_seeds']
+        if 'num_seeds' in torrent:
+            torrent_obj.connected_seeder = torrent['num_seeds']
+        if 'total_peers' in torrent:
+            torrent_obj.leecher = torrent['total_peers']
+        if 'num_peers' in torrent:
+            torrent_obj.connected_leecher = torrent['num_peers']
+        if 'total_uploaded' in torrent and 'active_time' in torrent:
+            torrent_obj.average_upload_speed = torrent['total_uploaded'] / torrent['active_time'] if torrent['active_time'] > 0 else 0
+        if 'all_time_download' in torrent and 'active_time' in torrent and 'finished_time' in torrent:
             download_time = torrent['active_time'] - torrent['finished_time']
             torrent_obj.average_download_speed = torrent['all_time_download'] / download_time if download_time > 0 else 0
         if 'time_since_transfer' in torrent:
             torrent_obj.last_activity = torrent['time_since_transfer'] \
                 if torrent['time_since_transfer'] > 0 else None
-        torrent_obj.progress = torrent['progress'] / 100 # Accept Range: 0-1
+        if 'progress' in torrent:
+            torrent_obj.progress = torrent['progress'] / 100 # Accept Range: 0-1
 
         return torrent_obj
 
@@ -173,28 +408,43 @@ class Deluge(object):
             'Seeding': TorrentStatus.Uploading,
         }[state]
 
+    # Get the torrents which still exist in the given list
+    def _remaining_torrents(self, torrent_hash_list):
+        return set(self._call('core.get_torrents_status', {'id': torrent_hash_list}, ['hash']))
+
     # Batch Remove Torrents
     def remove_torrents(self, torrent_hash_list, remove_data):
+        reasons = {}
         if self._client.deluge_version >= 2: # Method 'core.remove_torrents' is only available in Deluge 2.x
-            failures = self._call('core.remove_torrents', torrent_hash_list, remove_data)
-            failed_hash = [torrent[0] for torrent in failures]
-            return (
-                [torrent for torrent in torrent_hash_list if torrent not in failed_hash],
-                [{
-                    'hash': torrent[0],
-                    'reason': torrent[1],
-                } for torrent in failures],
-            )
-        else: # For Deluge 1.x, remove torrents one by one
-            success_hash = []
-            failures = []
-            for torrent in torrent_hash_list:
-                try:
-                    self._call('core.remove_torrent', torrent, remove_data)
-                    success_hash.append(torrent)
-                except RemoteFailure as e:
-                    failures.append({
-                        'hash': torrent,
-                        'reason': e.args[0],
-                    })
-            return (success_hash, failures)
+            try:
+                for torrent in self._call('core.remove_torrents', torrent_hash_list, remove_data):
+                    reasons[torrent[0]] = torrent[1]
+            except RemoteFailure as e:
+                for torrent in torrent_hash_list:
+                    reasons[torrent] = e.args[0]
+        else: # For Deluge 1.x, remove torrents one by one (in a pipeline)
+            try:
+                results = self._call_many([('core.remove_torrent', (torrent, remove_data))
+                    for torrent in torrent_hash_list])
+            except RemoteFailure as e:
+                results = [e] * len(torrent_hash_list)
+            for torrent, result in zip(torrent_hash_list, results):
+                if isinstance(result, RemoteFailure):
+                    reasons[torrent] = result.args[0]
+        # Check which torrents are actually removed
+        try:
+            remaining = self._remaining_torrents(torrent_hash_list)
+        except RemoteFailure:
+            remaining = set(torrent_hash_list)
+        # Forget the removed torrents
+        for torrent in torrent_hash_list:
+            if torrent not in remaining:
+                self._connection.torrent_cache.pop(torrent, None)
+                self._connection.torrent_objects.pop(torrent, None)
+        return (
+            [torrent for torrent in torrent_hash_list if torrent not in remaining],
+            [{
+                'hash': torrent,
+                'reason': reasons.get(torrent, 'The torrent still exists after being removed.'),
+            } for torrent in torrent_hash_list if torrent in remaining],
+        )
@@ -5,18 +5,33 @@ from .. import logger
 from ..torrent import Torrent
 from ..clientstatus import ClientStatus
 from ..torrentstatus import TorrentStatus
+from ..transport import HTTPSession
+from ..util.jsonstream import JSONArrayStream, JSONObjectStream
 from ..exception.loginfailure import LoginFailure
 from ..exception.connectionfailure import ConnectionFailure
 from ..exception.incompatibleapi import IncompatibleAPIVersion
+from ..exception.nosuchtorrent import NoSuchTorrent
 
 class qBittorrent(object):
+    # Properties of torrents can be requested concurrently
+    support_concurrent_requests = True
+    # Torrents can be removed concurrently, since the removal is verified with a new torrent list
+    support_concurrent_removal = True
+    # Sessions can be restored from the session cache
+    support_session_cache = True
+    # Torrents can be filtered by the server (API v2 only)
+    support_server_filters = True
+    # The most queries to request a filtered torrent list
+    # The whole list is requested if the filters need more queries
+    MAX_FILTER_QUERIES = 10
+
     # API Handler for v1
     class qBittorrentAPIHandlerV1(object):
         def __init__(self, host):
             # Host
             self._host = host
             # Requests Session
-            self._session = requests.Session()
+            self._session = HTTPSession(host)
         
         # Check API Compatibility
         def check_compatibility(self):
@@ -39,13 +54,23 @@ class qBittorrent(object):
         def login(self, username, password):
             return self._session.post(self._host+'/login', data={'username':username, 'password':password})
 
+        # Get cookies of the session
+        def cookies(self):
+            return requests.utils.dict_from_cookiejar(self._session.cookies)
+
+        # Restore cookies of the session
+        def set_cookies(self, cookies):
+            self._session.cookies.update(cookies)
+
         # Get server state
         def server_state(self):
             return self._session.get(self._host+'/sync/maindata')
 
         # Get torrent list
-        def torrent_list(self):
-            return self._session.get(self._host+'/query/torrents')
+        # Filtering by hashes is unsupported in API v1, so the hashes are ignored
+        # The response is streamed, so that it can be decoded while it's being received
+        def torrent_list(self, hashes=None):
+            return self._session.get(self._host+'/query/torrents', stream=True)
         
         # Get torrent's generic properties
         def torrent_generic_properties(self, torrent_hash):
@@ -69,7 +94,7 @@ class qBittorrent(object):
             # Host
             self._host = host
             # Requests Session
-            self._session = requests.Session()
+            self._session = HTTPSession(host)
         
         # Check API Compatibility
         def check_compatibility(self):
@@ -92,13 +117,31 @@ class qBittorrent(object):
         def login(self, username, password):
             return self._session.post(self._host+'/api/v2/auth/login', data={'username':username, 'password':password})
 
+        # Get cookies of the session
+        def cookies(self):
+            return requests.utils.dict_from_cookiejar(self._session.cookies)
+
+        # Restore cookies of the session
+        def set_cookies(self, cookies):
+            self._session.cookies.update(cookies)
+
         # Get server state
-        def server_state(self):
-            return self._session.get(self._host+'/api/v2/sync/maindata')
+        # The response only contains the changes since the response with the given rid
+        def server_state(self, rid=0, stream=False):
+            return self._session.get(self._host+'/api/v2/sync/maindata', params={'rid': rid}, stream=stream)
 
         # Get torrent list
-        def torrent_list(self):
-            return self._session.get(self._host+'/api/v2/torrents/info')
+        # The torrents can be filtered by hashes, a status filter and a category
+        # The response is streamed, so that it can be decoded while it's being received
+        def torrent_list(self, hashes=None, status_filter=None, category=None):
+            params = {}
+            if hashes is not None:
+                params['hashes'] = '|'.join(hashes)
+            if status_filter is not None:
+                params['filter'] = status_filter
+            if category is not None:
+                params['category'] = category
+            return self._session.get(self._host+'/api/v2/torrents/info', params=params, stream=True)
         
         # Get torrent's generic properties
         def torrent_generic_properties(self, torrent_hash):
@@ -116,20 +159,80 @@ class qBittorrent(object):
         def delete_torrents_and_data(self, torrent_hash_list):
             return self._session.post(self._host+'/api/v2/torrents/delete', data={'hashes':'|'.join(torrent_hash_list), 'deleteFiles': True})
 
-    def __init__(self, host):
+    # Fields of the torrent list that can replace the generic properties
+    _bulk_fields = [
+        'added_on',
+        'dlspeed',
+        'downloaded',
+        'num_complete',
+        'num_incomplete',
+        'num_leechs',
+        'num_seeds',
+        'seeding_time',
+        'time_active',
+        'uploaded',
+        'upspeed',
+    ]
+
+    # Torrent attributes provided by the generic properties
+    _property_fields = [
+        'average_download_speed',
+        'average_upload_speed',
+        'connected_leecher',
+        'connected_seeder',
+        'create_time',
+        'download_speed',
+        'downloaded',
+        'leecher',
+        'seeder',
+        'seeding_time',
+        'upload_speed',
+        'uploaded',
+    ]
+
+    # Status filters of the torrent list that select each torrent status
+    # The filters may select more torrents, which will be filtered again by the strategies
+    _status_filters = {
+        TorrentStatus.Downloading: 'downloading',
+        TorrentStatus.Uploading: 'seeding',
+        TorrentStatus.Error: 'errored',
+    }
+
+    def __init__(self, host, session_data = None):
         # Logger
         self._logger = logger.Logger.register(__name__)
 
+        # Data of the last session (restored from the session cache)
+        self._session_data = session_data if session_data is not None else {}
+        # Versions
+        self._version = self._session_data.get('version')
+        self._api_version = self._session_data.get('api_version')
+
         # Torrents list cache
-        self._torrents_list_cache = []
-        self._refresh_cycle = 30
+        self._torrents_list_cache = {}
         self._refresh_time = 0
+        # Required torrent attributes (None means all)
+        self._fields = None
+        # Whether torrent_properties() sends requests for each torrent in the last listing
+        self.requests_per_torrent = True
+
+        # Synchronized data of API v2
+        self._rid = 0
+        self._sync_torrents = {}
+        self._sync_server_state = {}
+        # Torrent objects, which are updated in place when synchronizing
+        self._torrent_objects = {}
 
         # Request Handler
         self._request_handler = None
         for obj in [self.qBittorrentAPIHandlerV2, self.qBittorrentAPIHandlerV1]: # New version API first
             handler = obj(host)
-            if handler.check_compatibility():
+            # We needn't check the compatibility again if we know the API version
+            if 'api_major_version' in self._session_data:
+                compatible = handler.api_major_version() == self._session_data['api_major_version']
+            else:
+                compatible = handler.check_compatibility()
+            if compatible:
                 self._request_handler = handler
                 break
         if self._request_handler is None:
@@ -137,6 +240,19 @@ class qBittorrent(object):
 
     # Login to qBittorrent
     def login(self, username, password):
+        # Try to reuse the cookies of the last session
+        # (API v1 is skipped since it doesn't need to login to get the version)
+        if self._request_handler.api_major_version() == 'v2' and self._session_data.get('cookies'):
+            self._request_handler.set_cookies(self._session_data['cookies'])
+            try:
+                request = self._request_handler.client_version()
+            except Exception as exc:
+                raise ConnectionFailure(str(exc))
+            if request.status_code == 200:
+                self._version = request.text
+                return
+            self._logger.debug('The cookies of the last session are rejected. Logging in again...')
+
         try:
             request = self._request_handler.login(username, password)
         except Exception as exc:
@@ -148,96 +264,231 @@ class qBittorrent(object):
         else:
             raise LoginFailure('The server returned HTTP %d.' % request.status_code)
     
+    # Synchronize main data (API v2 only)
+    # Only the changes since the last synchronization are transferred
+    def _sync(self):
+        if self._rid == 0:
+            # The first response contains all the torrents, so they are decoded while it's being received
+            stream = JSONObjectStream(self._request_handler.server_state(0, True), ['torrents'])
+            self._sync_torrents = {}
+            self._sync_server_state = {}
+            for torrent_hash, torrent in stream:
+                torrent['hash'] = torrent_hash
+                self._sync_torrents[torrent_hash] = torrent
+            result = stream.document
+        else:
+            result = self._request_handler.server_state(self._rid).json()
+            # The server may decide to send the full data again
+            if result.get('full_update', False):
+                self._sync_torrents = {}
+                self._sync_server_state = {}
+            # Apply changes of torrents
+            for torrent_hash, changes in result.get('torrents', {}).items():
+                if torrent_hash in self._sync_torrents:
+                    self._sync_torrents[torrent_hash].update(changes)
+                else:
+                    self._sync_torrents[torrent_hash] = dict(changes, hash=torrent_hash)
+        for torrent_hash in result.get('torrents_removed', []):
+            self._sync_torrents.pop(torrent_hash, None)
+            self._torrent_objects.pop(torrent_hash, None)
+        # Apply changes of server state
+        self._sync_server_state.update(result.get('server_state', {}))
+        self._rid = result.get('rid', 0)
+
+    # Get server state
+    def _server_state(self):
+        if self._request_handler.api_major_version() == 'v2':
+            self._sync()
+            return self._sync_server_state
+        return self._request_handler.server_state().json()['server_state']
+
     # Get client status
+    # The status is requested when it's used for the first time
     def client_status(self):
-        status = self._request_handler.server_state().json()['server_state']
-
-        cs = ClientStatus()
-        # Remote free space checker
-        cs.free_space = self.remote_free_space
-        # Downloading speed and downloaded size
-        cs.download_speed = status['dl_info_speed']
-        cs.total_downloaded = status['dl_info_data']
-        # Uploading speed and uploaded size
-        cs.upload_speed = status['up_info_speed']
-        cs.total_uploaded = status['up_info_data']
-        
-        return cs
+        return ClientStatus(self._session_status, self.remote_free_space)
+
+    # Get DL/UL information
+    def _session_status(self):
+        status = self._server_state()
+        return {
+            # Downloading speed and downloaded size
+            'download_speed': status['dl_info_speed'],
+            'total_downloaded': status['dl_info_data'],
+            # Uploading speed and uploaded size
+            'upload_speed': status['up_info_speed'],
+            'total_uploaded': status['up_info_data'],
+        }
 
     # Get qBittorrent Version
     def version(self):
-        request = self._request_handler.client_version()
-        return ('qBittorrent %s' % request.text)
+        if self._version is None:
+            self._version = self._request_handler.client_version().text
+        return ('qBittorrent %s' % self._version)
     
     # Get API version
     def api_version(self):
-        return ('%s (%s)' % (self._request_handler.api_version().text, self._request_handler.api_major_version()))
+        if self._api_version is None:
+            self._api_version = self._request_handler.api_version().text
+        return ('%s (%s)' % (self._api_version, self._request_handler.api_major_version()))
+
+    # Get the data to restore this session in the next run
+    def session_data(self):
+        return {
+            'api_major_version': self._request_handler.api_major_version(),
+            'cookies': self._request_handler.cookies(),
+            'version': self._version,
+            'api_version': self._api_version,
+        }
     
+    # Check whether any of the torrent attributes is required
+    def _is_required(self, *fields):
+        return self._fields is None or any([field in self._fields for field in fields])
+
+    # Plan the queries of the torrent list to select the torrents with the accepted values
+    # Returns a list of (status filter, category), or None if the whole list is needed
+    def _filter_queries(self, filters):
+        if filters is None or self._request_handler.api_major_version() != 'v2':
+            return None
+        # Each query selects one category and one status filter
+        categories = sorted(filters['category']) if 'category' in filters else [None]
+        status_filters = [None]
+        if 'status' in filters and all(status in qBittorrent._status_filters for status in filters['status']):
+            status_filters = sorted(set(qBittorrent._status_filters[status] for status in filters['status']))
+        # Give up the status filters first if there are too many queries
+        if len(categories) * len(status_filters) > qBittorrent.MAX_FILTER_QUERIES:
+            status_filters = [None]
+        queries = [(status_filter, category) for category in categories for status_filter in status_filters]
+        if len(queries) > qBittorrent.MAX_FILTER_QUERIES or queries == [(None, None)]:
+            return None
+        return queries
+
     # Get Torrents List
-    def torrents_list(self):
+    # Only the specified torrent attributes will be requested in torrent_properties(),
+    # and only the torrents with the accepted values (if specified) will be listed
+    def torrents_list(self, fields=None, filters=None):
+        self._fields = fields
+        queries = self._filter_queries(filters)
         # Request torrents list
-        torrent_hash = []
-        request = self._request_handler.torrent_list()
-        result = request.json()
-        # Save to cache
-        self._torrents_list_cache = result
+        if queries is not None:
+            self._logger.debug('Requesting the torrent list with %d filtered queries.' % len(queries))
+            # Merge the results of the queries by hash
+            torrents = {}
+            for status_filter, category in queries:
+                for torrent in JSONArrayStream(self._request_handler.torrent_list(None, status_filter, category), []):
+                    torrents[torrent['hash']] = torrent
+        elif self._request_handler.api_major_version() == 'v2':
+            self._sync()
+            torrents = dict(self._sync_torrents)
+        else:
+            torrents = {}
+            for torrent in JSONArrayStream(self._request_handler.torrent_list(), []):
+                torrents[torrent['hash']] = torrent
+        # Save to cache (indexed by hash)
+        # The cache is used as a snapshot until the next call of this method
+        self._torrents_list_cache = torrents
         self._refresh_time = time.time()
+        # Forget the torrents which don't exist anymore
+        for removed_hash in set(self._torrent_objects).difference(self._torrents_list_cache):
+            del self._torrent_objects[removed_hash]
+        # The tracker lists and the generic properties are requested for each torrent
+        self.requests_per_torrent = self._is_required('tracker') or \
+            (self._is_required(*qBittorrent._property_fields) and
+            any(not qBittorrent._is_bulk_complete(torrent) for torrent in torrents.values()))
         # Get hash for each torrent
-        for torrent in result:
-            torrent_hash.append(torrent['hash'])
-        return torrent_hash
+        return list(self._torrents_list_cache)
     
     # Get Torrent Properties
     def torrent_properties(self, torrent_hash):
-        if time.time() - self._refresh_time > self._refresh_cycle: # Out of date
+        if self._refresh_time == 0: # Not fetched yet
             self.torrents_list()
-        for torrent in self._torrents_list_cache:
-            if torrent['hash'] == torrent_hash:
-                # Get other information
-                properties = self._request_handler.torrent_generic_properties(torrent_hash).json()
-                trackers = self._request_handler.torrent_trackers(torrent_hash).json()
-                # Create torrent object
-                torrent_obj = Torrent()
-                torrent_obj.hash = torrent['hash']
-                torrent_obj.name = torrent['name']
-                # The category list will be empty if a torrent was not specified categories
-                if 'category' in torrent:
-                    torrent_obj.category = [torrent['category']] if len(torrent['category']) > 0 else []
-                elif 'label' in torrent:
-                    torrent_obj.category = [torrent['label']] if len(torrent['label']) > 0 else []
-                torrent_obj.tracker = [tracker['url'] for tracker in trackers]
-                torrent_obj.status = qBittorrent._judge_status(torrent['state'])
-                torrent_obj.stalled = torrent['state'] == 'stalledUP' or torrent['state'] == 'stalledDL'
-                torrent_obj.size = torrent['size']
-                torrent_obj.ratio = torrent['ratio']
-                torrent_obj.uploaded = properties['total_uploaded']
-                torrent_obj.downloaded = properties['total_downloaded']
-                torrent_obj.create_time = properties['addition_date']
-                torrent_obj.seeding_time = properties['seeding_time']
-                torrent_obj.upload_speed = properties['up_speed']
-                torrent_obj.download_speed = properties['dl_speed']
-                torrent_obj.seeder = properties['seeds_total']
-                torrent_obj.connected_seeder = properties['seeds']
-                torrent_obj.leecher = properties['peers_total']
-                torrent_obj.connected_leecher = properties['peers']
-                torrent_obj.average_upload_speed = properties['up_speed_avg']
-                torrent_obj.average_download_speed = properties['dl_speed_avg']
-                # For qBittorrent 3.x, the last activity field doesn't exist.
-                # We need to check the existence
-                if 'last_activity' in torrent:
-                    # Convert to time interval since last activity
-                    torrent_obj.last_activity = self._refresh_time - torrent['last_activity'] \
-                        if torrent['last_activity'] > 0 else None
-                torrent_obj.progress = torrent['progress']
-
-                return torrent_obj
+        if torrent_hash not in self._torrents_list_cache:
+            raise NoSuchTorrent("No such torrent of hash '%s'." % torrent_hash)
+        torrent = self._torrents_list_cache[torrent_hash]
+        # Create torrent object, or update the existing one
+        torrent_obj = self._torrent_objects.get(torrent_hash)
+        if torrent_obj is None:
+            torrent_obj = Torrent()
+            self._torrent_objects[torrent_hash] = torrent_obj
+        torrent_obj.hash = torrent['hash']
+        torrent_obj.name = torrent['name']
+        # The category list will be empty if a torrent was not specified categories
+        if 'category' in torrent:
+            torrent_obj.category = [torrent['category']] if len(torrent['category']) > 0 else []
+        elif 'label' in torrent:
+            torrent_obj.category = [torrent['label']] if len(torrent['label']) > 0 else []
+        # The torrent list only reports the current working tracker,
+        # so we request the whole tracker list when the strategies select torrents by trackers
+        if self._is_required('tracker'):
+            trackers = self._request_handler.torrent_trackers(torrent_hash).json()
+            torrent_obj.tracker = [tracker['url'] for tracker in trackers]
+        elif len(torrent.get('tracker', '')) > 0:
+            torrent_obj.tracker = [torrent['tracker']]
+        torrent_obj.status = qBittorrent._judge_status(torrent['state'])
+        torrent_obj.stalled = torrent['state'] == 'stalledUP' or torrent['state'] == 'stalledDL'
+        torrent_obj.size = torrent['size']
+        torrent_obj.ratio = torrent['ratio']
+        # The torrent list of qBittorrent 4.x contains all the transfer information,
+        # but in earlier versions we need to get it from the generic properties
+        if qBittorrent._is_bulk_complete(torrent):
+            qBittorrent._fill_transfer_info(torrent_obj, torrent)
+        elif self._is_required(*qBittorrent._property_fields):
+            properties = self._request_handler.torrent_generic_properties(torrent_hash).json()
+            qBittorrent._fill_transfer_properties(torrent_obj, properties)
+        # For qBittorrent 3.x, the last activity field doesn't exist.
+        # We need to check the existence
+        if 'last_activity' in torrent:
+            # Convert to time interval since last activity
+            torrent_obj.last_activity = self._refresh_time - torrent['last_activity'] \
+                if torrent['last_activity'] > 0 else None
+        torrent_obj.progress = torrent['progress']
+
+        return torrent_obj
+
+    # Check whether the torrent list has all the transfer information of the torrent (qBittorrent 4.x)
+    @staticmethod
+    def _is_bulk_complete(torrent):
+        return all(field in torrent for field in qBittorrent._bulk_fields)
+
+    # Fill transfer information from the torrent list
+    @staticmethod
+    def _fill_transfer_info(torrent_obj, torrent):
+        torrent_obj.uploaded = torrent['uploaded']
+        torrent_obj.downloaded = torrent['downloaded']
+        torrent_obj.create_time = torrent['added_on']
+        torrent_obj.seeding_time = torrent['seeding_time']
+        torrent_obj.upload_speed = torrent['upspeed']
+        torrent_obj.download_speed = torrent['dlspeed']
+        torrent_obj.seeder = torrent['num_complete']
+        torrent_obj.connected_seeder = torrent['num_seeds']
+        torrent_obj.leecher = torrent['num_incomplete']
+        torrent_obj.connected_leecher = torrent['num_leechs']
+        # Calculate the average speeds in the same way as qBittorrent does
+        download_time = torrent['time_active'] - torrent['seeding_time']
+        torrent_obj.average_upload_speed = torrent['uploaded'] / torrent['time_active'] if torrent['time_active'] > 0 else 0
+        torrent_obj.average_download_speed = torrent['downloaded'] / download_time if download_time > 0 else 0
+
+    # Fill transfer information from the generic properties
+    @staticmethod
+    def _fill_transfer_properties(torrent_obj, properties):
+        torrent_obj.uploaded = properties['total_uploaded']
+        torrent_obj.downloaded = properties['total_downloaded']
+        torrent_obj.create_time = properties['addition_date']
+        torrent_obj.seeding_time = properties['seeding_time']
+        torrent_obj.upload_speed = properties['up_speed']
+        torrent_obj.download_speed = properties['dl_speed']
+        torrent_obj.seeder = properties['seeds_total']
+        torrent_obj.connected_seeder = properties['seeds']
+        torrent_obj.leecher = properties['peers_total']
+        torrent_obj.connected_leecher = properties['peers']
+        torrent_obj.average_upload_speed = properties['up_speed_avg']
+        torrent_obj.average_download_speed = properties['dl_speed_avg']
 
     # Get free space
     def remote_free_space(self, path):
         # Actually the path is ignored
         self._logger.info('Get Free Space: The path is ignored ' +
             'since qBitorrent does not support to specific a path to check the free space.')
-        status = self._request_handler.server_state().json()['server_state']
+        status = self._server_state()
 
         # There is no free space data in qBittorrent 3.x
         if 'free_space_on_disk' in status:
@@ -263,16 +514,33 @@ class qBittorrent(object):
             status = TorrentStatus.Unknown
         return status
     
+    # Get the torrents which still exist in the given list
+    def _remaining_torrents(self, torrent_hash_list):
+        result = self._request_handler.torrent_list(torrent_hash_list).json()
+        hash_set = set(torrent_hash_list)
+        return set([torrent['hash'] for torrent in result if torrent['hash'] in hash_set])
+
     # Batch Remove Torrents
     # Return values: (success_hash_list, failed_list -> {hash: reason, ...})
     def remove_torrents(self, torrent_hash_list, remove_data):
-        request = self._request_handler.delete_torrents_and_data(torrent_hash_list) if remove_data \
-            else self._request_handler.delete_torrents(torrent_hash_list)
-        if request.status_code != 200:
-            return ([], [{
+        reason = 'The torrent still exists after being removed.'
+        try:
+            request = self._request_handler.delete_torrents_and_data(torrent_hash_list) if remove_data \
+                else self._request_handler.delete_torrents(torrent_hash_list)
+            if request.status_code != 200:
+                reason = 'The server responses HTTP %d.' % request.status_code
+        except Exception as exc:
+            reason = str(exc)
+        # The server doesn't report the result of each torrent,
+        # so we check which of them still exist
+        try:
+            remaining = self._remaining_torrents(torrent_hash_list)
+        except Exception:
+            remaining = set(torrent_hash_list)
+        return (
+            [torrent for torrent in torrent_hash_list if torrent not in remaining],
+            [{
                 'hash': torrent,
-                'reason': 'The server responses HTTP %d.' % request.status_code,
-            } for torrent in torrent_hash_list])
-        # Some of them may fail but we can't judge them,
-        # So we consider all of them as successful.
-        return (torrent_hash_list, [])
+                'reason': reason,
+            } for torrent in torrent_hash_list if torrent in remaining],
+        )
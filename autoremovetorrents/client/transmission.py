@@ -1,16 +1,36 @@
 #-*- coding:utf-8 -*-
-import requests
 import time
 from ..torrent import Torrent
 from ..clientstatus import ClientStatus
 from ..torrentstatus import TorrentStatus
+from ..transport import HTTPSession
+from ..util.jsonstream import JSONArrayStream
 from ..exception.connectionfailure import ConnectionFailure
 from ..exception.loginfailure import LoginFailure
 from ..exception.nosuchclient import NoSuchClient
 from ..exception.remotefailure import RemoteFailure
 
 class Transmission(object):
-    def __init__(self, host):
+    # Properties of torrents can be requested concurrently
+    support_concurrent_requests = True
+    # The torrents are built from the torrent list without any requests
+    requests_per_torrent = False
+    # Torrents can be removed concurrently, since the removal is verified with a new torrent-get
+    support_concurrent_removal = True
+    # RPC methods which can't be retried safely
+    NON_IDEMPOTENT_METHODS = ['torrent-remove']
+    # The first RPC version which supports the table format of torrent-get
+    TABLE_FORMAT_RPC_VERSION = 16
+    # Longest interval between two full refreshes of the torrents list (in seconds)
+    # Counters like seeding time advance without making torrents recently active
+    FULL_REFRESH_INTERVAL = 600
+    # Transmission reports the torrents active or removed in this period as recently active (in seconds)
+    # Changes before it are lost, so the list is refreshed in full if the last refresh is older
+    RECENTLY_ACTIVE_WINDOW = 60
+    # Sessions can be restored from the session cache
+    support_session_cache = True
+
+    def __init__(self, host, session_data = None):
         # Host
         self._host = host
         # Request id
@@ -18,138 +38,301 @@ class Transmission(object):
         # username & password
         self._username = None
         self._password = None
+        # Fields to request in torrents_list() and torrent_properties()
+        self._fields = Transmission._request_fields(None)
+        # Torrents returned by the last torrents_list() (keyed by hash)
+        self._torrents_list_cache = {}
+        # Field names of the rows in the cache if they are in table format
+        self._table_header = None
+        # Map of torrent ids to hashes
+        self._torrent_ids = {}
+        # Time of the last full refresh of the torrents list
+        self._last_full_refresh = 0
+        # Time of the last refresh of the torrents list (full or incremental)
+        self._last_refresh = 0
         # Requests Session
-        self._session = requests.Session()
+        self._session = HTTPSession(host)
+
+        # Restore the last session
+        # The session id will be updated when the server responds HTTP 409
+        session_data = session_data if session_data is not None else {}
+        if session_data.get('session_id') is not None:
+            self._session.headers.update({
+                'X-Transmission-Session-Id': session_data['session_id']
+            })
+        # Versions
+        self._version = session_data.get('version')
+        self._rpc_version = session_data.get('rpc_version')
 
     # Login to Transmission
     def login(self, username, password):
         # Save authentication of session
         self._session.auth = (username, password)
+        # Check the credentials (and the session id restored from the last session)
+        # The versions are requested in the meantime, so they are always up to date
+        session = self._make_transmission_request('session-get', {'fields': ['version', 'rpc-version']})
+        self._version = session['version']
+        self._rpc_version = session['rpc-version']
     
     # Make Transmission Request
-    def _make_transmission_request(self, method, arguments=None):
+    # The array in the stream path of the response is decoded while it's being received,
+    # and in that case, the stream is returned and the caller should check the result
+    def _make_transmission_request(self, method, arguments=None, stream_path=None):
         retry = 3
         while retry > 0:
             retry -= 1
             # Make request
             try:
                 request = self._session.post(self._host+'/transmission/rpc',
-                    json={'method':method, 'arguments':arguments, 'tag':self._request_id})
+                    json={'method':method, 'arguments':arguments, 'tag':self._request_id},
+                    idempotent=method not in Transmission.NON_IDEMPOTENT_METHODS,
+                    stream=stream_path is not None)
                 self._request_id += 1
             except Exception as exc:
                 raise ConnectionFailure(str(exc))
 
             if request.status_code == 409: # Save Session ID and retry
+                request.close()
+                # The daemon may have restarted, so the torrent ids can't be trusted
+                self._last_full_refresh = 0
                 self._session.headers.update({
                     'X-Transmission-Session-Id': request.headers['X-Transmission-Session-Id']
                 })
             elif request.status_code == 401: # Unauthorized user
+                request.close()
                 raise LoginFailure('Unauthorized user.')
             elif request.status_code == 200:
+                if stream_path is not None:
+                    return JSONArrayStream(request, stream_path)
                 result = request.json()
                 if result['result'] == 'success': # Success
                     return result['arguments']
                 else:
                     raise RemoteFailure(result['result'])
+        request.close()
         raise RemoteFailure('The server responsed %d on method %s.' \
             % (request.status_code, method)
         )
     
     # Get client status
+    # The status is requested when it's used for the first time
     def client_status(self):
-        status = self._make_transmission_request('session-stats')
+        return ClientStatus(self._session_status, self.remote_free_space)
 
-        cs = ClientStatus()
-        # Remote free space checker
-        cs.free_space = self.remote_free_space
-        # Download speed and downloaded  size
-        cs.download_speed = status['downloadSpeed']
-        cs.total_downloaded = status['current-stats']['downloadedBytes']
-        # Uploading speed and uploaded size
-        cs.upload_speed = status['uploadSpeed']
-        cs.total_uploaded = status['current-stats']['uploadedBytes']
-        
-        return cs
+    # Get DL/UL information
+    def _session_status(self):
+        status = self._make_transmission_request('session-stats')
+        return {
+            # Download speed and downloaded size
+            'download_speed': status['downloadSpeed'],
+            'total_downloaded': status['current-stats']['downloadedBytes'],
+            # Uploading speed and uploaded size
+            'upload_speed': status['uploadSpeed'],
+            'total_uploaded': status['current-stats']['uploadedBytes'],
+        }
     
+    # Get versions from the session information
+    def _session_versions(self):
+        if self._version is None or self._rpc_version is None:
+            session = self._make_transmission_request('session-get')
+            self._version = session['version']
+            self._rpc_version = session['rpc-version']
+
+    # Whether torrent-get supports the table format (RPC version 16 and later)
+    def _support_table_format(self):
+        self._session_versions()
+        return int(self._rpc_version) >= Transmission.TABLE_FORMAT_RPC_VERSION
+
     # Get Transmission Version
     def version(self):
-        ver = self._make_transmission_request('session-get')['version']
-        return ('Transmission %s' % ver)
+        self._session_versions()
+        return ('Transmission %s' % self._version)
     
     # Get API Version
     def api_version(self):
-        ver = self._make_transmission_request('session-get')['rpc-version']
-        return str(ver)
+        self._session_versions()
+        return str(self._rpc_version)
+
+    # Get the data to restore this session in the next run
+    def session_data(self):
+        return {
+            'session_id': self._session.headers.get('X-Transmission-Session-Id'),
+            'version': self._version,
+            'rpc_version': self._rpc_version,
+        }
+
+    # Fields of Transmission to build each torrent attribute
+    _field_map = {
+        'hash': ['hashString'],
+        'name': ['name'],
+        'category': ['labels'],
+        'tracker': ['trackers'],
+        'status': ['status', 'error'],
+        'stalled': ['isStalled'],
+        'size': ['totalSize'],
+        'ratio': ['uploadRatio'],
+        'uploaded': ['uploadedEver'],
+        'downloaded': ['downloadedEver'],
+        'create_time': ['addedDate'],
+        'seeding_time': ['secondsSeeding'],
+        'downloading_time': ['secondsDownloading'],
+        'upload_speed': ['rateUpload'],
+        'download_speed': ['rateDownload'],
+        'seeder': ['trackerStats'],
+        'connected_seeder': ['peersSendingToUs'],
+        'leecher': ['trackerStats'],
+        'connected_leecher': ['peersGettingFromUs'],
+        'last_activity': ['activityDate'],
+        'average_upload_speed': ['uploadedEver', 'secondsSeeding'],
+        'average_download_speed': ['downloadedEver', 'secondsDownloading'],
+        'progress': ['percentDone'],
+    }
+
+    # Get the fields of Transmission to build the torrent attributes
+    @staticmethod
+    def _request_fields(attributes):
+        # Hash and name are always needed to build torrents,
+        # and the id is used to find removed torrents in incremental refreshes
+        fields = set(['id', 'hashString', 'name'])
+        for attr in Transmission._field_map:
+            if attributes is None or attr in attributes:
+                fields.update(Transmission._field_map[attr])
+        return sorted(fields)
+
+    # Request torrents in a dict keyed by hash, and the ids of the removed torrents
+    # The torrents are in table format if self._table_header is not None
+    def _request_torrents(self, ids=None):
+        arguments = {'fields': self._fields}
+        if ids is not None:
+            arguments['ids'] = ids
+        # The table format saves repeating the keys in every torrent
+        if self._support_table_format():
+            arguments['format'] = 'table'
+        stream = self._make_transmission_request('torrent-get', arguments, ['arguments', 'torrents'])
+        try:
+            torrents = self._read_torrents(stream, ids, arguments.get('format') == 'table')
+        except ValueError as e:
+            raise RemoteFailure('Invalid response of torrent-get: %s' % str(e))
+        # An error response has no torrents, so the result is checked after reading them
+        if stream.document['result'] != 'success':
+            raise RemoteFailure(stream.document['result'])
+        return (torrents, stream.document['arguments'].get('removed', []))
+
+    # Read the torrents from the stream of torrent-get in a dict keyed by hash
+    def _read_torrents(self, stream, ids, table):
+        torrents = {}
+        if table:
+            order = None # Positions of the fields in the cached rows
+            for torrent in stream:
+                if order is None: # The first row is the field names
+                    if ids is None or self._table_header is None:
+                        self._table_header = torrent
+                    order = [torrent.index(field) for field in self._table_header]
+                    hash_index = self._table_header.index('hashString')
+                    continue
+                if order != list(range(0, len(order))): # Keep the layout of the cached rows
+                    torrent = [torrent[i] for i in order]
+                torrents[torrent[hash_index]] = torrent
+        else:
+            self._table_header = None
+            for torrent in stream:
+                torrents[torrent['hashString']] = torrent
+        return torrents
 
     # Get Torrents List
-    def torrents_list(self):
-        torrents_hash = []
-        for torrent in self._make_transmission_request('torrent-get', {'fields': ['hashString']})['torrents']:
-            torrents_hash.append(torrent['hashString'])
-        return torrents_hash
+    # All the properties of the torrents are requested at once,
+    # but only the specified torrent attributes will be requested
+    def torrents_list(self, fields=None):
+        fields = Transmission._request_fields(fields)
+        # The time is taken before the request, so no changes will be missed in the next refresh
+        refresh_time = time.time()
+        if fields == self._fields and self._last_full_refresh > 0 and \
+            refresh_time - self._last_full_refresh < Transmission.FULL_REFRESH_INTERVAL and \
+            refresh_time - self._last_refresh < Transmission.RECENTLY_ACTIVE_WINDOW:
+            # Only request the torrents changed since the last refresh
+            torrents, removed = self._request_torrents('recently-active')
+            for torrent_id in removed:
+                self._torrents_list_cache.pop(self._torrent_ids.pop(torrent_id, None), None)
+            self._torrents_list_cache.update(torrents)
+        else:
+            self._fields = fields
+            torrents = self._request_torrents()[0]
+            self._torrents_list_cache = torrents
+            self._torrent_ids = {}
+            self._last_full_refresh = refresh_time
+        self._last_refresh = refresh_time
+        # Map the ids to hashes to apply the removed ids in the next refresh
+        id_index = self._table_header.index('id') if self._table_header is not None else 'id'
+        for torrent_hash, torrent in torrents.items():
+            self._torrent_ids[torrent[id_index]] = torrent_hash
+        return list(self._torrents_list_cache)
 
     # Get Torrent Properties
     def torrent_properties(self, torrent_hash):
+        if torrent_hash in self._torrents_list_cache:
+            torrent = self._torrents_list_cache[torrent_hash]
+            if self._table_header is not None:
+                torrent = dict(zip(self._table_header, torrent))
+            return Transmission._build_torrent(torrent)
+        # The torrent is not in the list, so request it separately
         result = self._make_transmission_request('torrent-get',
             {
                 'ids': [torrent_hash],
-                'fields': [
-                    'hashString',
-                    'name',
-                    'trackers',
-                    'status',
-                    'totalSize',
-                    'uploadRatio',
-                    'uploadedEver',
-                    'addedDate',
-                    'secondsSeeding',
-                    'isStalled',
-                    'error',
-                    'labels',
-                    'rateDownload',
-                    'rateUpload',
-                    'peersGettingFromUs',
-                    'peersSendingToUs',
-                    'trackerStats',
-                    'activityDate',
-                    'uploadedEver',
-                    'secondsSeeding',
-                    'downloadedEver',
-                    'secondsDownloading',
-                    'percentDone',
-                ]}
-            )
+                'fields': self._fields,
+            })
         if len(result['torrents']) == 0: # No such torrent
             raise NoSuchClient("No such torrent of hash '%s'." % torrent_hash)
-        torrent = result['torrents'][0]
-        # Create torrent object
+        return Transmission._build_torrent(result['torrents'][0])
+
+    # Build torrent object with the fields that are provided
+    @staticmethod
+    def _build_torrent(torrent):
         torrent_obj = Torrent()
         torrent_obj.hash = torrent['hashString']
         torrent_obj.name = torrent['name']
         if 'labels' in torrent:
             torrent_obj.category = torrent['labels']
-        torrent_obj.tracker = [tracker['announce'] for tracker in torrent['trackers']]
-        torrent_obj.status = Transmission._judge_status(torrent['status'], torrent['error'])
-        torrent_obj.stalled = torrent['isStalled']
-        torrent_obj.size = torrent['totalSize']
-        torrent_obj.ratio = torrent['uploadRatio']
-        torrent_obj.uploaded = torrent['uploadedEver']
-        torrent_obj.downloaded = torrent['downloadedEver']
-        torrent_obj.create_time = torrent['addedDate']
-        torrent_obj.seeding_time = torrent['secondsSeeding']
-        torrent_obj.downloading_time = torrent['secondsDownloading']
-        torrent_obj.upload_speed = torrent['rateUpload']
-        torrent_obj.download_speed = torrent['rateDownload']
-        torrent_obj.seeder = sum([tracker['seederCount'] for tracker in torrent['trackerStats']])
-        torrent_obj.connected_seeder = torrent['peersSendingToUs']
-        torrent_obj.leecher = sum([tracker['leecherCount'] for tracker in torrent['trackerStats']])
-        torrent_obj.connected_leecher = torrent['peersGettingFromUs']
+        if 'trackers' in torrent:
+            torrent_obj.tracker = [tracker['announce'] for tracker in torrent['trackers']]
+        if 'status' in torrent:
+            torrent_obj.status = Transmission._judge_status(torrent['status'], torrent['error'])
+        if 'isStalled' in torrent:
+            torrent_obj.stalled = torrent['isStalled']
+        if 'totalSize' in torrent:
+            torrent_obj.size = torrent['totalSize']
+        if 'uploadRatio' in torrent:
+            torrent_obj.ratio = torrent['uploadRatio']
+        if 'uploadedEver' in torrent:
+            torrent_obj.uploaded = torrent['uploadedEver']
+        if 'downloadedEver' in torrent:
+            torrent_obj.downloaded = torrent['downloadedEver']
+        if 'addedDate' in torrent:
+            torrent_obj.create_time = torrent['addedDate']
+        if 'secondsSeeding' in torrent:
+            torrent_obj.seeding_time = torrent['secondsSeeding']
+        if 'secondsDownloading' in torrent:
+            torrent_obj.downloading_time = torrent['secondsDownloading']
+        if 'rateUpload' in torrent:
+            torrent_obj.upload_speed = torrent['rateUpload']
+        if 'rateDownload' in torrent:
+            torrent_obj.download_speed = torrent['rateDownload']
+        if 'trackerStats' in torrent:
+            torrent_obj.seeder = sum([tracker['seederCount'] for tracker in torrent['trackerStats']])
+            torrent_obj.leecher = sum([tracker['leecherCount'] for tracker in torrent['trackerStats']])
+        if 'peersSendingToUs' in torrent:
+            torrent_obj.connected_seeder = torrent['peersSendingToUs']
+        if 'peersGettingFromUs' in torrent:
+            torrent_obj.connected_leecher = torrent['peersGettingFromUs']
         # Convert to time interval since last activity
-        torrent_obj.last_activity = time.time() - torrent['activityDate'] \
-            if torrent['activityDate'] > 0 else None
-        torrent_obj.average_upload_speed = torrent['uploadedEver'] / torrent['secondsSeeding'] if torrent['secondsSeeding'] != 0 else 0
-        torrent_obj.average_download_speed = torrent['downloadedEver'] / torrent['secondsDownloading'] if torrent['secondsDownloading'] != 0 else 0
-        torrent_obj.progress = torrent['percentDone']
+        if 'activityDate' in torrent:
+            torrent_obj.last_activity = time.time() - torrent['activityDate'] \
+                if torrent['activityDate'] > 0 else None
+        if 'uploadedEver' in torrent and 'secondsSeeding' in torrent:
+            torrent_obj.average_upload_speed = torrent['uploadedEver'] / torrent['secondsSeeding'] if torrent['secondsSeeding'] != 0 else 0
+        if 'downloadedEver' in torrent and 'secondsDownloading' in torrent:
+            torrent_obj.average_download_speed = torrent['downloadedEver'] / torrent['secondsDownloading'] if torrent['secondsDownloading'] != 0 else 0
+        if 'percentDone' in torrent:
+            torrent_obj.progress = torrent['percentDone']
 
         return torrent_obj
     
@@ -176,17 +359,30 @@ class Transmission(object):
                 TorrentStatus.Unknown # 7:ISOLATED(Torrent can't find peers)
             ][state]
 
+    # Get the torrents which still exist in the given list
+    def _remaining_torrents(self, torrent_hash_list):
+        result = self._make_transmission_request('torrent-get',
+            {'ids': torrent_hash_list, 'fields': ['hashString']})
+        return set([torrent['hashString'] for torrent in result['torrents']])
+
     # Batch Remove Torrents
     # Return values: (success_hash_list, failed_hash_list : {hash: reason, ...})
     def remove_torrents(self, torrent_hash_list, remove_data):
+        reason = 'The torrent still exists after being removed.'
         try:
             self._make_transmission_request('torrent-remove',
                 {'ids': torrent_hash_list, 'delete-local-data': remove_data})
         except Exception as e:
-            # We couldn't judge which torrents are removed and which aren't when an exception was raised
-            # Therefore we think all the deletion have been failed
-            return ([], [{
+            reason = str(e)
+        # Check which torrents are actually removed
+        try:
+            remaining = self._remaining_torrents(torrent_hash_list)
+        except Exception:
+            remaining = set(torrent_hash_list)
+        return (
+            [torrent for torrent in torrent_hash_list if torrent not in remaining],
+            [{
                 'hash': torrent,
-                'reason': str(e),
-            } for torrent in torrent_hash_list])
-        return (torrent_hash_list, [])
+                'reason': reason,
+            } for torrent in torrent_hash_list if torrent in remaining],
+        )
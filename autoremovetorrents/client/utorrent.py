@@ -1,7 +1,7 @@
 #-*- coding:utf-8 -*-
 import re
+import threading
 import time
-import requests
 from ..torrent import Torrent
 from ..clientstatus import ClientStatus
 from autoremovetorrents.exception.connectionfailure import ConnectionFailure
@@ -9,21 +9,39 @@ from autoremovetorrents.exception.loginfailure import LoginFailure
 from autoremovetorrents.exception.nosuchtorrent import NoSuchTorrent
 from autoremovetorrents.exception.remotefailure import RemoteFailure
 from ..torrentstatus import TorrentStatus
+from ..transport import HTTPSession
+from ..util.jsonstream import JSONArrayStream
 
 class uTorrent(object):
+    # Properties of torrents can be requested concurrently
+    support_concurrent_requests = True
+    # The properties of the listed torrents are requested in one batch, not for each torrent
+    requests_per_torrent = False
+    # The longest URL of a getprops request
+    # The properties of many torrents are requested at once, but some servers reject long URLs
+    GETPROPS_URL_LENGTH = 8000
+
     def __init__(self, host):
         # Token
         self._token = ''
         # uTorrent version
         self._version = ''
         # Request Session
-        self._session = requests.Session()
+        self._session = HTTPSession(host)
         # Server information
         self._host = host
-        # Torrents list cache
-        self._torrents_list_cache = []
+        # Torrents list cache (indexed by hash)
+        self._torrents_list_cache = {}
+        # Cache ID of the torrents list, which is used to request the changes only
+        self._cache_id = None
         self._refresh_cycle = 30
         self._refresh_time = 0
+        # Required torrent attributes (None means all)
+        self._fields = None
+        # Torrent job properties cache (indexed by hash)
+        self._properties_cache = {}
+        # Lock for the caches, which are used by the concurrent requests
+        self._cache_lock = threading.RLock()
 
     # Login to uTorrent
     def login(self, username, password):
@@ -46,32 +64,37 @@ class uTorrent(object):
                 % request.status_code)
     
     # Get client status
+    # The status is requested when it's used for the first time
     def client_status(self):
+        return ClientStatus(self._session_status)
+
+    # Get DL/UL information
+    def _session_status(self):
         # In uTorrent we can only get the total download/upload speed,
         # and we should get it by summing the torrents list manually.
         
         # Get torrent list
         if time.time() - self._refresh_time > self._refresh_cycle:
-            self.torrents_list()
+            self._refresh_torrents_list()
         
         # Get sum
         download_speed = 0
         upload_speed = 0
-        for torrent in self._torrents_list_cache['torrents']:
+        with self._cache_lock:
+            torrents = list(self._torrents_list_cache.values())
+        for torrent in torrents:
             upload_speed += torrent[8]
             download_speed += torrent[8]
         
-        # Generate client status
-        cs = ClientStatus()
-        cs.download_speed = download_speed
-        cs.upload_speed = upload_speed
-
-        return cs
+        return {
+            'download_speed': download_speed,
+            'upload_speed': upload_speed,
+        }
     
     # Get uTorrent Version
     def version(self):
-        if self._version == '': # Call torrents_list() to get the version
-            self.torrents_list()
+        if self._version == '': # Refresh the torrents list to get the version
+            self._refresh_torrents_list()
         return ('uTorrent (bulid %s)' % str(self._version))
     
     # Get API Version
@@ -79,22 +102,80 @@ class uTorrent(object):
         return 'Unknown' # There is no interfaces to check the API version
     
     # Get Torrents List
-    def torrents_list(self):
+    # Only the specified torrent attributes will be requested in torrent_properties()
+    def torrents_list(self, fields=None):
+        self._fields = fields
+        return self._refresh_torrents_list()
+
+    # Refresh the torrents list cache and get the hashes in it
+    def _refresh_torrents_list(self):
+        with self._cache_lock:
+            return self._request_torrents_list()
+
+    # Request the torrents list and update the cache
+    def _request_torrents_list(self):
         # Request torrents list
-        torrents_hash = []
-        request = self._session.get(self._host+'/gui/', params={'list':1, 'token':self._token})
+        # With the cache ID, only the changed and removed torrents are returned
+        params = {'list':1, 'token':self._token}
+        if self._cache_id is not None:
+            params['cid'] = self._cache_id
+        # The full list is decoded while it's being received
+        request = self._session.get(self._host+'/gui/', params=params, stream=self._cache_id is None)
         request.encoding = 'utf-8'
         if request.status_code != 200: # Error
             raise RemoteFailure('The server reponsed %s.' % request.text)
-        result = request.json()
-        self._torrents_list_cache = result
+        # The cache is used as a snapshot until the next call of this method
+        if self._cache_id is None: # Full list
+            stream = JSONArrayStream(request, ['torrents'])
+            self._torrents_list_cache = {}
+            for torrent in stream:
+                self._torrents_list_cache[torrent[0]] = torrent
+            self._properties_cache = {}
+            result = stream.document
+        else:
+            result = request.json()
+            if 'torrents' in result: # Full list because the cache ID has expired
+                self._torrents_list_cache = {torrent[0]: torrent for torrent in result['torrents']}
+                self._properties_cache = {}
+            else: # Changes since the last request
+                for torrent in result.get('torrentp', []):
+                    self._torrents_list_cache[torrent[0]] = torrent
+                    self._properties_cache.pop(torrent[0], None)
+                for torrent_hash in result.get('torrentm', []):
+                    self._torrents_list_cache.pop(torrent_hash, None)
+                    self._properties_cache.pop(torrent_hash, None)
+        self._cache_id = result.get('torrentc')
         self._refresh_time = time.time()
         # Get version
         self._version = result['build']
         # Get hash for each torrent
-        for torrent in result['torrents']:
-            torrents_hash.append(torrent[0])
-        return torrents_hash
+        return list(self._torrents_list_cache)
+
+    # Get Torrent Job Properties of many torrents (indexed by hash)
+    # The hashes are split into requests of a safe URL length
+    def _torrents_job_properties(self, torrent_hash_list):
+        base_length = len('%s/gui/?action=getprops&token=%s' % (self._host, self._token))
+        chunks = [[]]
+        length = base_length
+        for torrent_hash in torrent_hash_list:
+            length += len('&hash=') + len(torrent_hash)
+            if length > uTorrent.GETPROPS_URL_LENGTH and len(chunks[-1]) > 0:
+                chunks.append([])
+                length = base_length + len('&hash=') + len(torrent_hash)
+            chunks[-1].append(torrent_hash)
+
+        properties = {}
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            request = self._session.get(self._host+'/gui/',
+                params={'action':'getprops', 'token':self._token, 'hash':chunk})
+            request.encoding = 'utf-8'
+            if request.status_code != 200: # Error
+                raise RemoteFailure('The server reponsed %s.' % request.text)
+            for props in request.json()['props']:
+                properties[props['hash']] = props
+        return properties
 
     # Get Torrent Job Properties
     def _torrent_job_properties(self, torrent_hash):
@@ -105,35 +186,43 @@ class uTorrent(object):
     
     # Get Torrent Properties
     def torrent_properties(self, torrent_hash):
-        if time.time() - self._refresh_time > self._refresh_cycle: # Refresh
-            self.torrents_list()
-        for torrent in self._torrents_list_cache['torrents']:
-            if torrent[0] == torrent_hash:
-                # Properties
+        if self._refresh_time == 0: # Not fetched yet
+            self._refresh_torrents_list()
+        with self._cache_lock:
+            torrent = self._torrents_list_cache.get(torrent_hash)
+        if torrent is None: # Not Found
+            raise NoSuchTorrent('No such torrent.')
+        # Create torrent object
+        torrent_obj = Torrent()
+        torrent_obj.hash = torrent[0]
+        torrent_obj.name = torrent[2]
+        # The category list will be empty if a torrent was not specified categories
+        torrent_obj.category = [torrent[11]] if len(torrent[11]) > 0 else []
+        torrent_obj.status = uTorrent._judge_status(torrent[1], torrent[4])
+        torrent_obj.size = torrent[3]
+        torrent_obj.ratio = torrent[7]/1000
+        torrent_obj.downloaded = torrent[5]
+        torrent_obj.uploaded = torrent[6]
+        torrent_obj.seeder = torrent[15]
+        torrent_obj.connected_seeder = torrent[14]
+        torrent_obj.leecher = torrent[13]
+        torrent_obj.connected_leecher = torrent[12]
+        torrent_obj.progress = torrent[4]
+        # Properties (only requested when they are required)
+        if self._fields is None or len(self._fields.intersection(['tracker', 'upload_speed', 'download_speed'])) > 0:
+            # Request the properties of all the torrents in the list at once
+            with self._cache_lock:
+                if torrent_hash not in self._properties_cache:
+                    self._properties_cache.update(self._torrents_job_properties(
+                        [h for h in self._torrents_list_cache if h not in self._properties_cache]))
+                properties = self._properties_cache.get(torrent_hash)
+            if properties is None: # Not returned in the batch, so request it separately
                 properties = self._torrent_job_properties(torrent_hash)
-                # Create torrent object
-                torrent_obj = Torrent()
-                torrent_obj.hash = torrent[0]
-                torrent_obj.name = torrent[2]
-                # The category list will be empty if a torrent was not specified categories
-                torrent_obj.category = [torrent[11]] if len(torrent[11]) > 0 else []
-                torrent_obj.tracker = properties['trackers'].split()
-                torrent_obj.status = uTorrent._judge_status(torrent[1], torrent[4])
-                torrent_obj.size = torrent[3]
-                torrent_obj.ratio = torrent[7]/1000
-                torrent_obj.downloaded = torrent[5]
-                torrent_obj.uploaded = torrent[6]
-                torrent_obj.upload_speed = properties['ulrate']
-                torrent_obj.download_speed = properties['dlrate']
-                torrent_obj.seeder = torrent[15]
-                torrent_obj.connected_seeder = torrent[14]
-                torrent_obj.leecher = torrent[13]
-                torrent_obj.connected_leecher = torrent[12]
-                torrent_obj.progress = torrent[4]
+            torrent_obj.tracker = properties['trackers'].split()
+            torrent_obj.upload_speed = properties['ulrate']
+            torrent_obj.download_speed = properties['dlrate']
 
-                return torrent_obj
-        # Not Found
-        raise NoSuchTorrent('No such torrent.')
+        return torrent_obj
 
     # Judge Torrent Status
     @staticmethod
@@ -157,6 +246,12 @@ class uTorrent(object):
             status = TorrentStatus.Unknown
         return status
 
+    # Get the torrents which still exist in the given list
+    # The torrents list is refreshed without changing the attributes required by the task
+    def _remaining_torrents(self, torrent_hash_list):
+        existing = set(self._refresh_torrents_list())
+        return set([torrent for torrent in torrent_hash_list if torrent in existing])
+
     # Batch Remove Torrents
     # Return values: (success_hash_list, failed_hash_list : {hash: failed_reason, ...})
     def remove_torrents(self, torrent_hash_list, remove_data):
@@ -164,16 +259,25 @@ class uTorrent(object):
             True: 'removedata',
             False: 'remove',
         }
-        # According to the tests, it looks like uTorrent can accept a very long URL
-        # (more than 10,000 torrents per request)
-        # Therefore we needn't to set a URL length limitation
-        request = self._session.get(self._host+'/gui/',
-            params={'action': actions[remove_data], 'token': self._token, 'hash': torrent_hash_list})
+        reason = 'The torrent still exists after being removed.'
+        try:
+            request = self._session.get(self._host+'/gui/',
+                params={'action': actions[remove_data], 'token': self._token, 'hash': torrent_hash_list},
+                idempotent=False)
+            if request.status_code != 200:
+                reason = 'The server responses HTTP %d.' % request.status_code
+        except Exception as exc:
+            reason = str(exc)
         # Note: uTorrent doesn't report the status of each torrent
-        # We think that all the torrents are removed when the request is sent successfully
-        if request.status_code != 200:
-            return ([], [{
+        # We check which of them still exist in the torrent list
+        try:
+            remaining = self._remaining_torrents(torrent_hash_list)
+        except Exception:
+            remaining = set(torrent_hash_list)
+        return (
+            [torrent for torrent in torrent_hash_list if torrent not in remaining],
+            [{
                 'hash': torrent,
-                'reason': 'The server responses HTTP %d.' % request.status_code,
-            } for torrent in torrent_hash_list])
-        return (torrent_hash_list, [])
+                'reason': reason,
+            } for torrent in torrent_hash_list if torrent in remaining],
+        )
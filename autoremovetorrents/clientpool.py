@@ -0,0 +1,63 @@
+#-*- coding:utf-8 -*-
+import threading
+
+# A logged-in client and its torrents, shared by the tasks on the same host
+class PooledClient(object):
+    def __init__(self):
+        # Hold it while using the client, so the tasks don't fetch the same torrents at the same time
+        self.lock = threading.RLock()
+        # The logged-in client
+        self.client = None
+        # The last torrents fetched and the request they were fetched with: (fields, filters, torrents)
+        self._snapshot = None
+
+    # Get the torrents fetched by another task
+    # Returns None if they don't have the fields or include the torrents required
+    def snapshot(self, fields, filters):
+        if self._snapshot is None:
+            return None
+        snapshot_fields, snapshot_filters, torrents = self._snapshot
+        # None means all the fields
+        if snapshot_fields is not None and (fields is None or not fields.issubset(snapshot_fields)):
+            return None
+        # The strategies filter the torrents again, so it's fine to have more
+        if len(snapshot_filters) > 0 and snapshot_filters != filters:
+            return None
+        return torrents
+
+    # Save the torrents for other tasks
+    def save_snapshot(self, fields, filters, torrents):
+        self._snapshot = (fields, filters, frozenset(torrents))
+
+    # Drop the torrents, e.g. some of them have been removed
+    def invalidate(self):
+        self._snapshot = None
+
+    # Drop the client if it fails
+    def discard(self, client):
+        with self.lock:
+            if self.client is client:
+                self.client = None
+                self._snapshot = None
+
+class ClientPool(object):
+    # Clients of each (client, host, username)
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    # Get the pooled client of the host (not logged in if it's new)
+    @staticmethod
+    def get(client, host, username):
+        key = (client, host, username)
+        with ClientPool._clients_lock:
+            if key not in ClientPool._clients:
+                ClientPool._clients[key] = PooledClient()
+            return ClientPool._clients[key]
+
+    # Drop all the torrents, so the tasks get fresh ones in the next run
+    @staticmethod
+    def invalidate_snapshots():
+        with ClientPool._clients_lock:
+            for pooled in ClientPool._clients.values():
+                with pooled.lock:
+                    pooled.invalidate()
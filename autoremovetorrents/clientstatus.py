@@ -2,14 +2,49 @@ from .util.convertbytes import convert_bytes
 from .util.convertspeed import convert_speed
 
 class ClientStatus(object):
-    def __init__(self):
+    # Attributes provided by the loader
+    _loader_attributes = ['download_speed', 'total_downloaded', 'upload_speed', 'total_uploaded']
+
+    def __init__(self, loader = None, free_space = None):
         # Proper attributes:
         # free_space, total_download_speed, total_upload_speed, etc.
         #
         # Note:
         # The type of free_space is a function because we need to specific a
         # directory to check its free space.
-        pass
+        #
+        # The loader is a function which returns a dict of the attributes above.
+        # It's called only once when one of the attributes is read for the first time,
+        # so we needn't request the client if no strategies use them.
+        self._loader = loader
+
+        # Free space checker, whose results are cached for each path
+        self._free_space = free_space
+        self._free_space_cache = {}
+        if free_space is not None:
+            self.free_space = self._cached_free_space
+
+    # Load attributes when they are read for the first time
+    def __getattr__(self, name):
+        loader = self.__dict__.get('_loader')
+        if loader is not None and name in ClientStatus._loader_attributes:
+            self._loader = None
+            for key, value in loader().items():
+                setattr(self, key, value)
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError("'ClientStatus' object has no attribute '%s'" % name)
+
+    # Check free space of the path (only once for each path)
+    def _cached_free_space(self, path):
+        if path not in self._free_space_cache:
+            self._free_space_cache[path] = self._free_space(path)
+        return self._free_space_cache[path]
+
+    # Whether the attributes have been loaded
+    @property
+    def loaded(self):
+        return self._loader is None
 
     # Format client status info
     def __str__(self):
@@ -1,7 +1,7 @@
-def urlparse_(url):
-    try: # for Python 3
-        from urllib.parse import urlparse
-    except ImportError: # for Python 2.7
-        from urlparse import urlparse
+try: # for Python 3
+    from urllib.parse import urlparse
+except ImportError: # for Python 2.7
+    from urlparse import urlparse
 
-    return urlparse(url)
\ No newline at end of file
+def urlparse_(url):
+    return urlparse(url)
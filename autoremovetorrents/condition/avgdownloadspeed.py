@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class AverageDownloadSpeedCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['average_download_speed']
+
     def __init__(self, avg_dl_speed, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._avg_dl_speed = avg_dl_speed # In KiB
@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class AverageUploadSpeedCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['average_upload_speed']
+
     def __init__(self, avg_ul_speed, comp = Comparer.LT):
         Condition.__init__(self) # Initialize remain and remove list
         self._avg_ul_speed = avg_ul_speed # In KiB
@@ -4,10 +4,18 @@ from enum import Enum
 Comparer = Enum('Comparer', ('LT', 'GT', 'EQ'))
 
 class Condition(object):
+    # Torrent attributes required by this condition
+    required_fields = []
+
     def __init__(self):
         # Results
         self.remain = set()
         self.remove = set()
+
+    # Get the torrent attributes required by this condition with the given settings
+    @classmethod
+    def fields(cls, settings):
+        return set(cls.required_fields)
     
     def compare(self, a, b, comp):
         return (comp == Comparer.LT and a < b) \
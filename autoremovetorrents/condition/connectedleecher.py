@@ -3,6 +3,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class ConnectedLeecherCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['connected_leecher', 'status']
+
     def __init__(self, cl, comp = Comparer.LT):
         Condition.__init__(self) # Initialize remain and remove list
         self._connected_leecher = cl
@@ -3,6 +3,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class ConnectedSeederCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['connected_seeder', 'status']
+
     def __init__(self, cs, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._connected_seeder = cs
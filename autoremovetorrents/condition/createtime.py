@@ -5,6 +5,9 @@ from .base import Comparer
 from .base import Condition
 
 class CreateTimeCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['create_time']
+
     def __init__(self, ct, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._create_time = ct
@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class DownloadsCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['downloaded']
+
     def __init__(self, downloads, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._downloads = downloads * (1 << 30) # Convert bytes to GiB
@@ -4,6 +4,9 @@ from .base import Comparer
 from .base import Condition
 
 class DownloadingTimeCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['downloading_time']
+
     def __init__(self, dt, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._downloading_time = dt
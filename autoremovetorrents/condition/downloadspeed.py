@@ -3,6 +3,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class DownloadSpeedCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['download_speed', 'status']
+
     def __init__(self, downspeed, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._downspeed = downspeed
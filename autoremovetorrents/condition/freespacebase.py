@@ -3,6 +3,9 @@ from .sortbase import ConditionWithSort
 # FreeSpaceConditionBase:
 # Implements basic deletion logic via free space
 class FreeSpaceConditionBase(ConditionWithSort):
+    # Torrent attributes required by this condition
+    required_fields = ['size']
+
     def __init__(self, settings):
         ConditionWithSort.__init__(self, settings['action'])
         self._min = settings['min'] * (1 << 30) # Convert B to GiB
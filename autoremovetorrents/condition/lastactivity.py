@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class LastActivityCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['last_activity']
+
     def __init__(self, la, comp = Comparer.GT):
         Condition.__init__(self)
         self._last_activity = la
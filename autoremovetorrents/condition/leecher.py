@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class LeecherCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['leecher']
+
     def __init__(self, l, comp = Comparer.LT):
         Condition.__init__(self) # Initialize remain and remove list
         self._leecher = l
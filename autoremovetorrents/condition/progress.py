@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class ProgressCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['progress']
+
     def __init__(self, progress, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._progress = progress
@@ -5,6 +5,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class RatioCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['ratio']
+
     def __init__(self, r, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._ratio = r
@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class SeederCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['seeder']
+
     def __init__(self, s, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._seeder = s
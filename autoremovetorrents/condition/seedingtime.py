@@ -5,6 +5,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class SeedingTimeCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['seeding_time']
+
     def __init__(self, st, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._seeding_time = st
@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class SizeCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['size']
+
     def __init__(self, s, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._size = s * (1 << 30) # Convert to GiB
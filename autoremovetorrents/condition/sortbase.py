@@ -4,10 +4,30 @@ from .base import Condition
 from autoremovetorrents.compatibility.inf_ import inf_
 
 class ConditionWithSort(Condition):
+    # Torrent attributes used to sort the torrents in each action
+    _sort_fields = {
+        'remove-old-seeds': 'create_time',
+        'remove-new-seeds': 'create_time',
+        'remove-big-seeds': 'size',
+        'remove-small-seeds': 'size',
+        'remove-active-seeds': 'last_activity',
+        'remove-inactive-seeds': 'last_activity',
+        'remove-slow-upload-seeds': 'upload_speed',
+        'remove-fast-upload-seeds': 'upload_speed',
+    }
+
     def __init__(self, action):
         Condition.__init__(self)
         self._action = action
 
+    # The sorting attribute depends on the action
+    @classmethod
+    def fields(cls, settings):
+        fields = super(ConditionWithSort, cls).fields(settings)
+        if isinstance(settings, dict) and settings.get('action') in cls._sort_fields:
+            fields.add(cls._sort_fields[settings['action']])
+        return fields
+
     def sort_torrents(self, torrents):
         handlers = {
             'remove-old-seeds': {'key':lambda torrent: torrent.create_time, 'reverse':False},
@@ -3,6 +3,9 @@
 from .sortbase import ConditionWithSort
 
 class TorrentSizeCondition(ConditionWithSort):
+    # Torrent attributes required by this condition
+    required_fields = ['size']
+
     def __init__(self, settings):
         ConditionWithSort.__init__(self, settings['action'])
         self._limit = settings['limit'] * 1073741824 # limit = limit * 1GiB
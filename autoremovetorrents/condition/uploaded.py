@@ -2,6 +2,9 @@ from .base import Comparer
 from .base import Condition
 
 class UploadsCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['uploaded']
+
     def __init__(self, uploads, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._uploads = uploads * (1 << 30) # Convert bytes to GiB
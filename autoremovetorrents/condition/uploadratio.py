@@ -4,6 +4,9 @@ from .base import Condition
 class UploadRatioCondition(Condition):
     '''Upload Ratio refers to the ratio of uploaded size to file size'''
 
+    # Torrent attributes required by this condition
+    required_fields = ['size', 'uploaded']
+
     def __init__(self, ratio, comp = Comparer.GT):
         Condition.__init__(self) # Initialize remain and remove list
         self._ratio = ratio
@@ -3,6 +3,9 @@ from .base import Condition
 from ..torrentstatus import TorrentStatus
 
 class UploadSpeedCondition(Condition):
+    # Torrent attributes required by this condition
+    required_fields = ['status', 'upload_speed']
+
     def __init__(self, upspeed, comp = Comparer.LT):
         Condition.__init__(self) # Initialize remain and remove list
         self._upspeed = upspeed
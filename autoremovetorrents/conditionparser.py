@@ -125,6 +125,21 @@ class ConditionParser(object):
         # Logger
         self._logger = logger.Logger.register(__name__)
     
+    # Get the torrent attributes required by the expression
+    # Returns None if the expression can't be analyzed
+    @classmethod
+    def fields(cls, expression):
+        fields = set()
+        lexer = ConditionLexer().lexer
+        try:
+            lexer.input(expression)
+            for token in iter(lexer.token, None):
+                if token.type == 'STRING' and token.value in cls._condition_map:
+                    fields.update(cls._condition_map[token.value].fields(None))
+        except Exception:
+            return None # Let the parser report the error
+        return fields
+
     # Apply this strategy
     def apply(self, client_status, torrents):
         self._torrent_list = set(torrents)
@@ -0,0 +1,3 @@
+class InvalidPattern(RuntimeError):
+    def __init__(self, arg):
+        self.args = (arg, )
\ No newline at end of file
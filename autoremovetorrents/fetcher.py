@@ -0,0 +1,131 @@
+#-*- coding:utf-8 -*-
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import logger
+
+class ConcurrentFetcher(object):
+    # Smoothing factor of the latency average
+    LATENCY_SMOOTHING = 0.2
+    # The limit is lowered when the average latency exceeds the baseline by this factor
+    LATENCY_TOLERANCE = 2.0
+
+    # If the transport is given, the limit follows the latency of its HTTP requests,
+    # since the calls answered from caches don't show the load of the client
+    def __init__(self, max_concurrency = 4, retry = 2, transport = None):
+        # Logger
+        self._logger = logger.Logger.register(__name__)
+
+        # Concurrency limits
+        # We start with one request in flight and increase it when the client is healthy,
+        # since some WebUIs (e.g. qBittorrent) are single-threaded.
+        self._max_limit = max(1, max_concurrency)
+        self._limit = 1
+        # Successful requests since the last adjustment
+        self._successes = 0
+
+        # Times to retry a failed request
+        self._retry = retry
+
+        # Transport of the client (optional)
+        self._transport = transport
+
+        # Average latency and the lowest average latency we have seen
+        self._latency = None
+        self._baseline = None
+
+    # Current concurrency limit
+    @property
+    def limit(self):
+        return self._limit
+
+    # Call the function and measure its latency
+    # The records are logged into the buffer of the thread calling map()
+    @staticmethod
+    def _timed_call(func, item, log_buffer):
+        logger.Logger.set_buffer(log_buffer)
+        start = time.time()
+        try:
+            return (func(item), None, time.time() - start)
+        except Exception as e:
+            return (None, e, time.time() - start)
+        finally:
+            logger.Logger.set_buffer(None)
+
+    # Adjust the concurrency limit according to the latency and errors
+    def _adjust(self, latency, failed):
+        if failed: # Back off quickly on errors
+            self._limit = max(1, self._limit // 2)
+            self._successes = 0
+            self._logger.debug('A request failed. Concurrency limit is lowered to %d.' % self._limit)
+            return
+
+        # Update the average latency
+        if self._transport is not None and self._transport.latency is not None:
+            self._latency = self._transport.latency
+        elif self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += ConcurrentFetcher.LATENCY_SMOOTHING * (latency - self._latency)
+        if self._baseline is None or self._latency < self._baseline:
+            self._baseline = self._latency
+
+        if self._latency > self._baseline * ConcurrentFetcher.LATENCY_TOLERANCE: # Overloaded
+            if self._limit > 1:
+                self._limit -= 1
+                self._logger.debug('Latency rises to %.3fs. Concurrency limit is lowered to %d.' %
+                    (self._latency, self._limit))
+            self._successes = 0
+        else:
+            # Increase the limit after a full window of successful requests
+            self._successes += 1
+            if self._successes >= self._limit and self._limit < self._max_limit:
+                self._limit += 1
+                self._successes = 0
+
+    # Apply the function to each item with bounded concurrency
+    # The results are yielded in the same order as the items
+    def map(self, func, items):
+        items = list(items)
+
+        # No need to start threads
+        if self._max_limit == 1:
+            for item in items:
+                yield func(item)
+            return
+
+        log_buffer = logger.Logger.buffer()
+        results = {}
+        retries = {}
+        next_index = 0 # The next item to be submitted
+        yield_index = 0 # The next result to be yielded
+        queue = [] # Failed items to be submitted again
+        with ThreadPoolExecutor(max_workers=self._max_limit) as executor:
+            pending = {}
+            while yield_index < len(items):
+                # Keep the requests in flight up to the limit
+                while len(pending) < self._limit and (len(queue) > 0 or next_index < len(items)):
+                    if len(queue) > 0:
+                        index = queue.pop(0)
+                    else:
+                        index = next_index
+                        next_index += 1
+                    pending[executor.submit(ConcurrentFetcher._timed_call, func, items[index], log_buffer)] = index
+
+                # Wait for any of the requests
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    index = pending.pop(future)
+                    result, exc, latency = future.result()
+                    self._adjust(latency, exc is not None)
+                    if exc is None:
+                        results[index] = result
+                    elif retries.get(index, 0) < self._retry:
+                        retries[index] = retries.get(index, 0) + 1
+                        queue.append(index)
+                    else:
+                        raise exc
+
+                # Yield the results in order
+                while yield_index in results:
+                    yield results.pop(yield_index)
+                    yield_index += 1
@@ -3,10 +3,12 @@ from .category import CategoryFilter
 from .status import StatusFilter
 from .tracker import TrackerFilter
 from .ratio import RatioFilter
+from .name import NameFilter
 
 __all__ = [
     'CategoryFilter',
     'StatusFilter',
     'TrackerFilter',
-    'RatioFilter'
+    'RatioFilter',
+    'NameFilter'
 ]
\ No newline at end of file
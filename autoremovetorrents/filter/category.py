@@ -1,26 +1,24 @@
 #-*- coding:utf-8 -*-
 
 from .filter import Filter
+from ..torrentindex import TorrentIndex
+from ..util.patternmatcher import PatternMatcher
 
 class CategoryFilter(Filter):
     def __init__(self, all_category, ac, re):
         Filter.__init__(self, all_category, ac, re)
+        # The categories can be glob patterns or regular expressions
+        self._accept_matcher = PatternMatcher.get(ac)
+        self._reject_matcher = PatternMatcher.get(re)
 
-    def apply(self, torrents):
+    def apply(self, torrents, index = None):
+        if index is None:
+            index = TorrentIndex(torrents)
         # Pick accepted torrents
-        accepts = set()
         if self._all: # Accpet all torrents (all_categories)
             accepts = set(torrents)
-        elif len(self._accept) > 0: # Accept specific category torrents (categories)
-            for torrent in torrents:
-                for category in torrent.category:
-                    if category in self._accept:
-                        accepts.add(torrent)
-        # Pick rejected torrents
-        rejects = set()
-        if len(self._reject) > 0: # Reject specific category torrents (excluded_categories)
-            for torrent in accepts:
-                for category in torrent.category:
-                    if category in self._reject:
-                        rejects.add(torrent)
+        else: # Accept specific category torrents (categories)
+            accepts = index.categories(self._accept_matcher.match).intersection(torrents)
+        # Pick rejected torrents (excluded_categories)
+        rejects = index.categories(self._reject_matcher.match) if len(self._reject) > 0 else set()
         return accepts.difference(rejects) # Return their difference
\ No newline at end of file
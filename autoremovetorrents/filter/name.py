@@ -0,0 +1,22 @@
+#-*- coding:utf-8 -*-
+
+from .filter import Filter
+from ..util.patternmatcher import PatternMatcher
+
+class NameFilter(Filter):
+    def __init__(self, all_name, ac, re):
+        Filter.__init__(self, all_name, ac, re)
+        # The names can be glob patterns or regular expressions
+        self._accept_matcher = PatternMatcher.get(ac)
+        self._reject_matcher = PatternMatcher.get(re)
+
+    def apply(self, torrents, index = None):
+        # Pick accepted torrents
+        if self._all: # Accept all torrents (all_names)
+            accepts = set(torrents)
+        else: # Accept specific name torrents (names)
+            accepts = set([torrent for torrent in torrents if self._accept_matcher.match(torrent.name)])
+        # Remove rejected torrents (excluded_names)
+        if len(self._reject) > 0:
+            accepts = set([torrent for torrent in accepts if not self._reject_matcher.match(torrent.name)])
+        return accepts
@@ -20,7 +20,7 @@ class RatioFilter(Filter):
                 f"This will result in no torrents passing this filter."
             )
 
-    def apply(self, torrents):
+    def apply(self, torrents, index = None):
         # If min_ratio is at its effective minimum (0.0) and max_ratio is at its effective maximum (infinity),
         # it means no specific filtering range is specified by the user for ratios,
         # so all torrents pass this filter.
@@ -1,5 +1,6 @@
 from .filter import Filter
 from ..torrentstatus import TorrentStatus
+from ..torrentindex import TorrentIndex
 from .. import logger
 
 class StatusFilter(Filter):
@@ -31,21 +32,43 @@ class StatusFilter(Filter):
                 )
         return result, stallUp, stallDown
 
-    def apply(self, torrents):
+    # Get the statuses of the torrents which may be accepted
+    # Stalled torrents are accepted by their status, and unknown statuses are ignored
+    @staticmethod
+    def candidate_status(status_list):
         result = set()
+        for status in status_list:
+            status = str(status).lower()
+            if status == 'stalledupload':
+                result.add(TorrentStatus.Uploading)
+            elif status == 'stalleddownload':
+                result.add(TorrentStatus.Downloading)
+            elif status.capitalize() in TorrentStatus.__members__:
+                result.add(TorrentStatus[status.capitalize()])
+        return result
+
+    def apply(self, torrents, index = None):
+        if index is None:
+            index = TorrentIndex(torrents)
+        uploading = [TorrentStatus.Uploading]
+        downloading = [TorrentStatus.Downloading]
+
+        # Pick accepted torrents
+        if self._all:
+            result = set(torrents)
+        else:
+            result = index.status(self._acc_status).intersection(torrents)
+        if self._acc_stallup:
+            result.update(index.stalled(uploading).intersection(torrents))
+        if self._acc_stalldown:
+            result.update(index.stalled(downloading).intersection(torrents))
+
+        # Remove rejected torrents
+        if len(self._rej_status) > 0:
+            result.difference_update(index.status(self._rej_status))
+        if self._rej_stallup:
+            result.difference_update(index.stalled(uploading))
+        if self._rej_stalldown:
+            result.difference_update(index.stalled(downloading))
 
-        for torrent in torrents:
-            if self._all or torrent.status in self._acc_status:
-                result.add(torrent)
-            if self._acc_stallup and torrent.status == TorrentStatus.Uploading and torrent.stalled:
-                result.add(torrent)
-            if self._acc_stalldown and torrent.status == TorrentStatus.Downloading and torrent.stalled:
-                result.add(torrent)
-            if torrent in result and torrent.status in self._rej_status:
-                result.remove(torrent)
-            if torrent in result and self._rej_stallup and torrent.status == TorrentStatus.Uploading and torrent.stalled:
-                result.remove(torrent)
-            if torrent in result and self._rej_stalldown and torrent.status == TorrentStatus.Downloading and torrent.stalled:
-                result.remove(torrent)
-        
         return result
\ No newline at end of file
@@ -1,29 +1,32 @@
 #-*- coding:utf-8 -*-
 
-from ..compatibility.urlparse_ import urlparse_
 from .filter import Filter
+from ..torrentindex import TorrentIndex
+from ..util.domaintrie import DomainTrie
+from ..util.hostname import tracker_hostname
 
 class TrackerFilter(Filter):
     def __init__(self, all_tracker, ac, re):
         Filter.__init__(self, all_tracker, ac, re)
+        self._accept_match = TrackerFilter._matcher(ac)
+        self._reject_match = TrackerFilter._matcher(re)
 
-    def apply(self, torrents):
+    # Make a function which checks whether a tracker URL matches any of the rules
+    # The rules are hostnames, with wildcards supported by DomainTrie, or full URLs
+    @staticmethod
+    def _matcher(rules):
+        urls = set([str(rule) for rule in rules if '://' in str(rule)])
+        domains = DomainTrie([rule for rule in rules if '://' not in str(rule)])
+        return lambda url: url in urls or domains.match(tracker_hostname(url))
+
+    def apply(self, torrents, index = None):
+        if index is None:
+            index = TorrentIndex(torrents)
         # Pick accepted torrents
-        accepts = set()
         if self._all: # Accpet all torrents (all_trackers)
             accepts = set(torrents)
-        elif len(self._accept) > 0: # Accept specific tracker torrents (trackers)
-            for torrent in torrents:
-                for tracker in torrent.tracker:
-                    hostname = urlparse_(tracker).hostname
-                    if hostname in self._accept or tracker in self._accept:
-                        accepts.add(torrent)
-        # Pick rejected torrents
-        rejects = set()
-        if len(self._reject) > 0: # Reject specific tracker torrents (excluded_trackers)
-            for torrent in accepts:
-                for tracker in torrent.tracker:
-                    hostname = urlparse_(tracker).hostname
-                    if hostname in self._reject or tracker in self._reject:
-                        rejects.add(torrent)
+        else: # Accept specific tracker torrents (trackers)
+            accepts = index.trackers(self._accept_match).intersection(torrents)
+        # Pick rejected torrents (excluded_trackers)
+        rejects = index.trackers(self._reject_match) if len(self._reject) > 0 else set()
         return accepts.difference(rejects) # Return their difference
\ No newline at end of file
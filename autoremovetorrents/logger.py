@@ -3,6 +3,7 @@
 
 import os
 import logging
+import threading
 from datetime import datetime
 
 class Logger(object):
@@ -19,6 +20,12 @@ class Logger(object):
     # Logging path
     log_path = ''
 
+    # Records held back in each thread, so that the logs of a task running
+    # in parallel with others are written together
+    _local = threading.local()
+    # Lock for writing the held records and registering loggers
+    _lock = threading.RLock()
+
     @staticmethod
     def init(log_path = '', file_debug_log = False, output_debug_log = False):
         # Set logging path
@@ -32,25 +39,63 @@ class Logger(object):
         Logger.file_handler.setLevel(logging.DEBUG if file_debug_log else logging.INFO)
         file_handler_formatter = logging.Formatter(Logger.FILE_FORMAT, datefmt=Logger.DATE_FORMAT)
         Logger.file_handler.setFormatter(file_handler_formatter)
+        Logger.file_handler.addFilter(BufferFilter(Logger.file_handler))
 
         # Initialize the console handler
         Logger.console_handler = logging.StreamHandler()
         Logger.console_handler.setLevel(logging.DEBUG if output_debug_log else logging.INFO)
         console_handler_formatter = logging.Formatter(Logger.OUTPUT_FORMAT, datefmt=Logger.DATE_FORMAT)
         Logger.console_handler.setFormatter(console_handler_formatter)
+        Logger.console_handler.addFilter(BufferFilter(Logger.console_handler))
 
     @staticmethod
     def register(name):
         logger = logging.getLogger(name)
 
-        # Remove old loggers
-        logger.handlers = []
+        with Logger._lock:
+            # Configure logging
+            logger.setLevel(logging.DEBUG)
+
+            # Replace old handlers
+            logger.handlers = [Logger.file_handler, Logger.console_handler]
+
+        return logger
+
+    # Hold back the records logged in the current thread
+    @staticmethod
+    def start_buffering():
+        Logger._local.buffer = []
+
+    # Write the held records of the current thread
+    @staticmethod
+    def flush_buffer():
+        buffer = getattr(Logger._local, 'buffer', None)
+        Logger._local.buffer = None
+        if buffer is not None:
+            with Logger._lock:
+                for handler, record in buffer:
+                    handler.handle(record)
 
-        # Configure logging
-        logger.setLevel(logging.DEBUG)
+    # The held records of the current thread (None if not buffering)
+    @staticmethod
+    def buffer():
+        return getattr(Logger._local, 'buffer', None)
+
+    # Hold back the records of the current thread in the given buffer (None to stop)
+    # Worker threads use the buffer of the thread they work for
+    @staticmethod
+    def set_buffer(buffer):
+        Logger._local.buffer = buffer
 
-        # Add Handlers
-        logger.addHandler(Logger.file_handler)
-        logger.addHandler(Logger.console_handler)
+# Hold back the records of the handler if the thread is buffering
+class BufferFilter(logging.Filter):
+    def __init__(self, handler):
+        logging.Filter.__init__(self)
+        self._handler = handler
 
-        return logger
\ No newline at end of file
+    def filter(self, record):
+        buffer = Logger.buffer()
+        if buffer is None:
+            return True
+        buffer.append((self._handler, record))
+        return False
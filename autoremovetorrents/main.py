@@ -2,13 +2,41 @@
 # -*- coding:utf-8 -*-
 import sys
 import getopt
+import signal
+import threading
 import traceback
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from . import logger
+from .sessioncache import SessionCache
 from .task import Task
+from .clientpool import ClientPool
 from autoremovetorrents.version import __version__
 from autoremovetorrents.compatibility.open_ import open_
 
+# Run the task, and keep the task object for the next run
+def run_task(tasks, task_name, conf, remove_torrents, session_cache):
+    if task_name not in tasks:
+        tasks[task_name] = Task(task_name, conf[task_name], remove_torrents, session_cache)
+    tasks[task_name].execute()
+
+# Log the failure of the task
+def log_task_failure(lg, task_name):
+    lg.error(traceback.format_exc().splitlines()[-1])
+    lg.error('Task %s fails. ' % task_name)
+    lg.debug('Exception Logged', exc_info=True)
+
+# Run the task in a worker thread
+# Its logs are held back and written together when it finishes
+def run_task_parallel(lg, tasks, task_name, conf, remove_torrents, session_cache):
+    logger.Logger.start_buffering()
+    try:
+        run_task(tasks, task_name, conf, remove_torrents, session_cache)
+    except Exception:
+        log_task_failure(lg, task_name)
+    finally:
+        logger.Logger.flush_buffer()
+
 def pre_processor(argv):
     # View Mode
     view_mode = False
@@ -23,10 +51,26 @@ def pre_processor(argv):
     # Decide whether to output debug log
     debug_mode = False
 
+    # The path of the session cache file (disabled by default)
+    session_cache_path = None
+
+    # Daemon mode, which runs the tasks periodically
+    daemon_mode = False
+    # Seconds between two runs in daemon mode
+    interval = 300
+    # Number of tasks to run in parallel
+    jobs = 1
+
     # Get arguments
     try:
-        opts = getopt.getopt(argv, 'vc:t:l:d', ['view', 'conf=', 'task=', 'log=', 'debug'])[0]
-    except getopt.GetoptError:
+        opts = getopt.getopt(argv, 'vc:t:l:d',
+            ['view', 'conf=', 'task=', 'log=', 'debug', 'session-cache=', 'daemon', 'interval=', 'jobs='])[0]
+        for opt,arg in opts:
+            if opt == '--interval':
+                interval = float(arg)
+            elif opt == '--jobs':
+                jobs = max(1, int(arg))
+    except (getopt.GetoptError, ValueError):
         print('Invalid arguments.')
         sys.exit(255)
     for opt,arg in opts:
@@ -40,6 +84,10 @@ def pre_processor(argv):
             log_path = arg
         elif opt in ('-d', '--debug'):
             debug_mode = True
+        elif opt == '--session-cache':
+            session_cache_path = arg
+        elif opt == '--daemon':
+            daemon_mode = True
 
     # Init logger
     logger.Logger.init(log_path, file_debug_log = debug_mode, output_debug_log = debug_mode)
@@ -55,17 +103,48 @@ def pre_processor(argv):
             result = yaml.safe_load(stream)
         lg.info('Found %d task(s) in the file.' % len(result))
 
+        # Load session cache
+        session_cache = SessionCache(session_cache_path) if session_cache_path is not None else None
+
+        # Stop the daemon after the current run when receiving signals
+        stop = threading.Event()
+        if daemon_mode:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda signum, frame: stop.set())
+
         # Run tasks
-        if task == None: # Task name specified
-            for task_name in result:
+        # The task objects are kept in daemon mode, so the clients needn't login again
+        tasks = {}
+        while True:
+            # The torrents may have changed since the last run
+            ClientPool.invalidate_snapshots()
+            if task == None and jobs > 1: # Run the tasks in parallel
+                # The tasks mostly wait for the clients, so threads are enough
+                with ThreadPoolExecutor(max_workers=jobs) as executor:
+                    futures = [executor.submit(run_task_parallel, lg, tasks, task_name, result, not view_mode, session_cache)
+                        for task_name in result]
+                    # Wait for every task
+                    for future in futures:
+                        future.result()
+            elif task == None: # Task name specified
+                for task_name in result:
+                    try:
+                        run_task(tasks, task_name, result, not view_mode, session_cache)
+                    except Exception:
+                        log_task_failure(lg, task_name)
+            else:
                 try:
-                    Task(task_name, result[task_name], not view_mode).execute()
+                    run_task(tasks, task, result, not view_mode, session_cache)
                 except Exception:
-                    lg.error(traceback.format_exc().splitlines()[-1])
-                    lg.error('Task %s fails. ' % task_name)
-                    lg.debug('Exception Logged', exc_info=True)
-        else:
-            Task(task, result[task], not view_mode).execute()
+                    if not daemon_mode:
+                        raise
+                    log_task_failure(lg, task)
+            # Wait for the next run
+            if not daemon_mode or stop.wait(interval):
+                break
+            lg.info('Running the tasks again...')
+        if daemon_mode:
+            lg.info('Stopped.')
     except Exception:
         lg.error(traceback.format_exc().splitlines()[-1])
         lg.debug('Exception Logged', exc_info=True)
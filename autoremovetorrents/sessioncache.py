@@ -0,0 +1,67 @@
+#-*- coding:utf-8 -*-
+import os
+import json
+import time
+import threading
+from . import logger
+from .compatibility.open_ import open_
+
+class SessionCache(object):
+    # Time to live of each entry (in seconds)
+    DEFAULT_TTL = 3600
+
+    def __init__(self, path, ttl = DEFAULT_TTL):
+        # Logger
+        self._logger = logger.Logger.register(__name__)
+
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    # Make the key of a session
+    @staticmethod
+    def key(client, host, username):
+        return '%s|%s|%s' % (client, host, username)
+
+    # Load the cache file
+    def _load(self):
+        try:
+            with open_(self._path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (IOError, OSError, ValueError):
+            return {}
+
+    # Save the cache file
+    def _save(self):
+        temp_path = self._path + '.tmp'
+        try:
+            # The file contains login cookies, so only the owner can read it
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self._path)
+        except (IOError, OSError) as e:
+            self._logger.warning('Failed to save the session cache: %s' % str(e))
+
+    # Get the data of a session
+    # Returns None if the session doesn't exist or has expired
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry['time'] > self._ttl:
+                return None
+            return entry['data']
+
+    # Save the data of a session
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = {'time': time.time(), 'data': data}
+            self._save()
+
+    # Remove a session
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
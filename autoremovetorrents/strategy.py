@@ -29,8 +29,39 @@ from .filter.category import CategoryFilter
 from .filter.status import StatusFilter
 from .filter.tracker import TrackerFilter
 from .filter.ratio import RatioFilter
+from .filter.name import NameFilter
+from .torrentindex import TorrentIndex
+from .util.patternmatcher import PatternMatcher
 
 class Strategy(object):
+    # Condition collection (as constant)
+    _condition_map = {
+        'create_time': CreateTimeCondition,
+        'free_space': FreeSpaceCondition,
+        'last_activity': LastActivityCondition,
+        'max_average_downloadspeed': AverageDownloadSpeedCondition,
+        'max_connected_seeder': ConnectedSeederCondition,
+        'max_download': DownloadsCondition,
+        'max_downloadspeed': DownloadSpeedCondition,
+        'max_progress': ProgressCondition,
+        'max_seeder': SeederCondition,
+        'max_upload': UploadsCondition,
+        'maximum_number': TorrentNumberCondition,
+        'min_average_uploadspeed': AverageUploadSpeedCondition,
+        'min_connected_leecher': ConnectedLeecherCondition,
+        'min_leecher': LeecherCondition,
+        'min_uploadspeed': UploadSpeedCondition,
+        'nothing': EmptyCondition,
+        'ratio': RatioCondition,
+        'remote_free_space': RemoteFreeSpaceCondition,
+        'remove': ConditionParser,
+        'seed_size': TorrentSizeCondition,
+        'seeding_time': SeedingTimeCondition,
+        'downloading_time': DownloadingTimeCondition,
+        'max_size': SizeCondition,
+        'upload_ratio': UploadRatioCondition,
+    }
+
     def __init__(self, name, conf):
         # Logger
         self._logger = logger.Logger.register(__name__)
@@ -45,6 +76,9 @@ class Strategy(object):
         self.remain_list = set()
         self.remove_list = set()
 
+        # Index of the torrents
+        self._index = None
+
         # Filter ALL
         self._all_categories = conf['all_categories'] if 'all_categories' in conf \
             else not 'categories' in conf
@@ -52,20 +86,64 @@ class Strategy(object):
             else not 'trackers' in conf
         self._all_status = conf['all_status'] if 'all_status' in conf \
             else not 'status' in conf
+        self._all_names = conf['all_names'] if 'all_names' in conf \
+            else not 'names' in conf
 
         # Print debug log
         self._logger.debug("Configuration of strategy '%s':" % self._name)
         self._logger.debug('Configurated filters and conditions: %s' % ', '.join(self._conf))
 
+    # Get the torrent attributes required by the filters and conditions
+    # Returns None if we can't decide them, which means all the attributes are required
+    def required_fields(self):
+        fields = set()
+        # Filters
+        if not self._all_categories or 'excluded_categories' in self._conf:
+            fields.add('category')
+        if not self._all_status or 'excluded_status' in self._conf:
+            fields.update(['status', 'stalled'])
+        if not self._all_trackers or 'excluded_trackers' in self._conf:
+            fields.add('tracker')
+        if 'min_ratio' in self._conf or 'max_ratio' in self._conf:
+            fields.add('ratio')
+        if not self._all_names or 'excluded_names' in self._conf:
+            fields.add('name')
+        # Conditions
+        for conf in self._conf:
+            if conf in Strategy._condition_map:
+                condition_fields = Strategy._condition_map[conf].fields(self._conf[conf])
+                if condition_fields is None:
+                    return None
+                fields.update(condition_fields)
+        return fields
+
+    # Get the values of the torrent attributes which may be accepted by the filters
+    # An attribute is absent if all of its values may be accepted
+    # Clients can use them to select the candidate torrents for us
+    def accepted_values(self):
+        values = {}
+        if not self._all_categories:
+            categories = self._conf.get('categories', [])
+            categories = categories if isinstance(categories, list) else [categories]
+            # Clients only select the categories by their names, not by patterns
+            # The names are strings, like the patterns matched by the filter (e.g. 2023 in YAML)
+            if all([PatternMatcher.is_literal(category) for category in categories]):
+                values['category'] = set([str(category) for category in categories])
+        if not self._all_status:
+            status = self._conf.get('status', [])
+            values['status'] = StatusFilter.candidate_status(status if isinstance(status, list) else [status])
+        return values
+
     # Apply Filters
     def _apply_filters(self):
         filter_conf = [
             {'all':self._all_categories, 'ac':'categories', 're':'excluded_categories'}, # Category filter
             {'all':self._all_status, 'ac':'status', 're':'excluded_status'}, # Status filter
             {'all':self._all_trackers, 'ac':'trackers', 're':'excluded_trackers'}, # Tracker filter
+            {'all':self._all_names, 'ac':'names', 're':'excluded_names'}, # Name filter
             {'type': 'ratio', 'min_key': 'min_ratio', 'max_key': 'max_ratio'} # Ratio filter
         ]
-        filter_obj = [CategoryFilter, StatusFilter, TrackerFilter, RatioFilter]
+        filter_obj = [CategoryFilter, StatusFilter, TrackerFilter, NameFilter, RatioFilter]
 
         for i in range(0, len(filter_conf)):
             current_filter_class = filter_obj[i]
@@ -86,7 +164,7 @@ class Strategy(object):
                         self._logger.debug(torrent)
 
                     active_filter = current_filter_class(min_ratio_val, max_ratio_val)
-                    self.remain_list = active_filter.apply(self.remain_list)
+                    self.remain_list = active_filter.apply(self.remain_list, self._index)
 
                     self._logger.debug('OUTPUT: %d torrent(s) after applying the filter.' % len(self.remain_list))
                     for torrent in self.remain_list:
@@ -124,7 +202,7 @@ class Strategy(object):
                     self._conf[accept_field],
                     self._conf[reject_field]
                 )
-                self.remain_list = active_filter.apply(self.remain_list)
+                self.remain_list = active_filter.apply(self.remain_list, self._index)
 
                 self._logger.debug('OUTPUT: %d torrent(s) after applying the filter.' % len(self.remain_list))
                 for torrent in self.remain_list:
@@ -132,33 +210,7 @@ class Strategy(object):
 
     # Apply Conditions
     def _apply_conditions(self, client_status):
-        # Condition collection
-        conditions = {
-            'create_time': CreateTimeCondition,
-            'free_space': FreeSpaceCondition,
-            'last_activity': LastActivityCondition,
-            'max_average_downloadspeed': AverageDownloadSpeedCondition,
-            'max_connected_seeder': ConnectedSeederCondition,
-            'max_download': DownloadsCondition,
-            'max_downloadspeed': DownloadSpeedCondition,
-            'max_progress': ProgressCondition,
-            'max_seeder': SeederCondition,
-            'max_upload': UploadsCondition,
-            'maximum_number': TorrentNumberCondition,
-            'min_average_uploadspeed': AverageUploadSpeedCondition,
-            'min_connected_leecher': ConnectedLeecherCondition,
-            'min_leecher': LeecherCondition,
-            'min_uploadspeed': UploadSpeedCondition,
-            'nothing': EmptyCondition,
-            'ratio': RatioCondition,
-            'remote_free_space': RemoteFreeSpaceCondition,
-            'remove': ConditionParser,
-            'seed_size': TorrentSizeCondition,
-            'seeding_time': SeedingTimeCondition,
-            'downloading_time': DownloadingTimeCondition,
-            'max_size': SizeCondition,
-            'upload_ratio': UploadRatioCondition,
-        }
+        conditions = Strategy._condition_map
         for conf in self._conf:
             if conf in conditions:
                 # Print debug log
@@ -190,9 +242,11 @@ class Strategy(object):
                     self._logger.debug(torrent)
 
     # Execute this strategy
-    def execute(self, client_status, torrents):
+    # The index of the torrents can be shared by the strategies of a task
+    def execute(self, client_status, torrents, index = None):
         self._logger.info('Running strategy %s...' % self._name)
         self.remain_list = torrents
+        self._index = index if index is not None else TorrentIndex(torrents)
         # Apply Filters
         self._apply_filters()
         # Apply Conditions
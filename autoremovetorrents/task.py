@@ -7,12 +7,22 @@ from .client.qbittorrent import qBittorrent
 from .client.transmission import Transmission
 from .client.utorrent import uTorrent
 from .client.deluge import Deluge
+from .exception.incompatibleapi import IncompatibleAPIVersion
+from .exception.loginfailure import LoginFailure
 from .exception.nosuchclient import NoSuchClient
+from .clientpool import ClientPool
+from .fetcher import ConcurrentFetcher
+from .sessioncache import SessionCache
 from .strategy import Strategy
+from .torrentindex import TorrentIndex
+from .transport import Transport
 from autoremovetorrents.torrent import Torrent
 
 class Task(object):
-    def __init__(self, name, conf, remove_torrents = True):
+    # Times to retry removing the failed chunks
+    REMOVE_RETRY = 2
+
+    def __init__(self, name, conf, remove_torrents = True, session_cache = None):
         # Logger
         self._logger = logger.Logger.register(__name__)
 
@@ -31,12 +41,21 @@ class Task(object):
         # Read configurations
         self._client_name = conf['client']
         self._client = None
+        self._pooled_client = None
         self._host = conf['host'].rstrip('/')
         self._username = conf['username'] if 'username' in conf else ''
         self._password = conf['password'] if 'password' in conf else ''
         self._enabled_remove = remove_torrents
         self._delete_data = conf['delete_data'] if 'delete_data' in conf else False
         self._strategies = conf['strategies'] if 'strategies' in conf else []
+        self._concurrent_requests = conf['concurrent_requests'] if 'concurrent_requests' in conf else 4
+        self._remove_chunk_size = conf['remove_chunk_size'] if 'remove_chunk_size' in conf else 100
+        self._connect_timeout = conf['connect_timeout'] if 'connect_timeout' in conf else 10
+        self._read_timeout = conf['read_timeout'] if 'read_timeout' in conf else 60
+        self._retries = conf['retries'] if 'retries' in conf else 3
+
+        # Strategy objects
+        self._strategy_objects = []
 
         # Torrents
         self._torrents = set()
@@ -45,13 +64,17 @@ class Task(object):
         # Client status
         self._client_status = None
 
+        # Session cache (optional)
+        self._session_cache = session_cache
+
         # Allow removing specified torrents(for CI testing only)
+        self._force_delete = set()
         if 'force_delete' in conf:
             for hash_ in conf['force_delete']:
                 torrent_obj = Torrent()
                 torrent_obj.hash = hash_
                 torrent_obj.name = hash_
-                self._remove.add(torrent_obj)
+                self._force_delete.add(torrent_obj)
 
         # Print debug logs
         self._logger.debug("Configuration of task '%s':" % self._name)
@@ -61,6 +84,12 @@ class Task(object):
         self._logger.debug('Remove Torrents: %s, Remove Torrents and Data: %s' % (
             self._enabled_remove, self._delete_data
         ))
+        self._logger.debug('Concurrent Requests: %d, Remove Chunk Size: %d' % (
+            self._concurrent_requests, self._remove_chunk_size
+        ))
+        self._logger.debug('Connect Timeout: %s, Read Timeout: %s, Retries: %d' % (
+            self._connect_timeout, self._read_timeout, self._retries
+        ))
         self._logger.debug('Strategies: %s' % ', '.join(self._strategies))
 
     # Login client
@@ -78,48 +107,191 @@ class Task(object):
         if self._client_name not in clients:
             raise NoSuchClient("The client `%s` doesn't exist." % self._client_name)
 
-        # Initialize client object
-        self._client = clients[self._client_name](self._host)
+        client_class = clients[self._client_name]
+
+        # Share the client with the other tasks on the same host
+        self._pooled_client = ClientPool.get(self._client_name, self._host, self._username)
+        with self._pooled_client.lock:
+            if self._pooled_client.client is not None:
+                self._client = self._pooled_client.client
+                self._logger.info('Reusing the client logged in by another task.')
+            else:
+                self._login_client(client_class)
+                self._pooled_client.client = self._client
+
+    # Login a new client
+    def _login_client(self, client_class):
+        # Find the last session in cache
+        cache_key = None
+        session_data = None
+        if self._session_cache is not None and getattr(client_class, 'support_session_cache', False):
+            cache_key = SessionCache.key(self._client_name, self._host, self._username)
+            session_data = self._session_cache.get(cache_key)
+
+        # Options of HTTP requests
+        # The connection pool should be large enough for the concurrent requests
+        Transport.configure(self._host, self._connect_timeout, self._read_timeout,
+            self._retries, max(10, self._concurrent_requests))
 
         # Login
         self._logger.info('Logging in...')
-        self._client.login(self._username, self._password)
+        try:
+            self._connect(client_class, session_data)
+        except (LoginFailure, IncompatibleAPIVersion):
+            if session_data is None:
+                raise
+            # The cached session may be out of date
+            self._logger.info('Failed to restore the last session. Logging in again...')
+            self._session_cache.invalidate(cache_key)
+            self._connect(client_class, None)
         self._logger.info('Login successfully. The client is %s.' % self._client.version())
         self._logger.info('WebUI API version: %s' % self._client.api_version())
 
-        # Get client status
-        self._client_status = self._client.client_status()
-        self._logger.info(self._client_status)
+        # Save the session for the next run
+        if cache_key is not None:
+            self._session_cache.set(cache_key, self._client.session_data())
+
+    # Initialize client object and login
+    def _connect(self, client_class, session_data):
+        self._client = client_class(self._host, session_data) if session_data is not None \
+            else client_class(self._host)
+        self._client.login(self._username, self._password)
+
+    # Get the torrent attributes required by the strategies
+    # Returns None if all the attributes are required
+    def _required_fields(self):
+        fields = set(['hash', 'name'])
+        for strategy in self._strategy_objects:
+            strategy_fields = strategy.required_fields()
+            if strategy_fields is None:
+                return None
+            fields.update(strategy_fields)
+        return fields
+
+    # Get the values of the torrent attributes accepted by any of the strategies
+    # An attribute is absent if all of its values are accepted by some strategy
+    def _accepted_values(self):
+        values = None
+        for strategy in self._strategy_objects:
+            strategy_values = strategy.accepted_values()
+            if values is None:
+                values = strategy_values
+            else:
+                values = {attr: values[attr] | strategy_values[attr]
+                    for attr in values if attr in strategy_values}
+        # An empty list means no torrents are accepted, but we'd rather not make the client filter it
+        return {attr: value for attr, value in values.items() if len(value) > 0} \
+            if values is not None else {}
 
     # Get all the torrents and properties
     def _get_torrents(self):
         self._logger.info('Getting all the torrents...')
+        # Only request the attributes we need
+        fields = self._required_fields()
+        self._logger.debug('Required torrent attributes: %s' %
+            (', '.join(sorted(fields)) if fields is not None else 'all'))
+        # Let the client select the candidate torrents if it can
+        filters = {}
+        if getattr(self._client, 'support_server_filters', False):
+            filters = self._accepted_values()
+            self._logger.debug('Torrent filters sent to the client: %s' %
+                (', '.join(sorted(filters)) if len(filters) > 0 else 'none'))
+
+        # Another task on the same host may have fetched them
+        torrents = self._pooled_client.snapshot(fields, filters)
+        if torrents is not None:
+            self._torrents = set(torrents)
+            self._logger.info('Found %d torrent(s) fetched by another task.' % len(self._torrents))
+            return
+        self._fetch_torrents(fields, filters)
+        self._pooled_client.save_snapshot(fields, filters, self._torrents)
+
+    # Fetch the torrents from the client
+    def _fetch_torrents(self, fields, filters):
         last_time = time.time()
-        for hash_value in self._client.torrents_list():
+        if getattr(self._client, 'support_server_filters', False):
+            torrents_hash = self._client.torrents_list(fields, filters)
+        else:
+            torrents_hash = self._client.torrents_list(fields)
+        # Some clients need a request for each torrent, so we send them concurrently
+        # Otherwise the torrents are built from the list, which threads would only slow down
+        transport = Transport.get(self._host)
+        fetcher = ConcurrentFetcher(self._concurrent_requests
+            if self._client.support_concurrent_requests and getattr(self._client, 'requests_per_torrent', True)
+            else 1, transport=transport)
+        for torrent in fetcher.map(self._client.torrent_properties, torrents_hash):
             # Append new torrent
-            self._torrents.add(self._client.torrent_properties(hash_value))
+            self._torrents.add(torrent)
             # For a long waiting
             if time.time() - last_time > 1:
                 self._logger.info('Please wait...We have found %d torrent(s).' %
                     len(self._torrents))
                 last_time = time.time()
         self._logger.info('Found %d torrent(s) in the client.' % len(self._torrents))
+        if transport.requests > 0:
+            self._logger.debug('Average latency: %.3fs in %d HTTP request(s).' %
+                (transport.latency, transport.requests))
 
     # Apply strategies
     def _apply_strategies(self):
-        for strategy_name in self._strategies:
-            strategy = Strategy(strategy_name, self._strategies[strategy_name])
-            strategy.execute(self._client_status, self._torrents)
+        # Index the torrents once for all the strategies
+        index = TorrentIndex(self._torrents)
+        for strategy in self._strategy_objects:
+            strategy.execute(self._client_status, self._torrents, index)
             self._remove.update(strategy.remove_list)
+        # Print client status if the strategies have requested it
+        if self._client_status.loaded:
+            self._logger.info(self._client_status)
+
+    # Remove a chunk of torrents
+    # Return values: (success_hash_list, failed_list -> {hash: reason, ...})
+    def _remove_chunk(self, hash_list):
+        try:
+            return self._client.remove_torrents(hash_list, self._delete_data)
+        except Exception as e:
+            return ([], [{
+                'hash': hash_,
+                'reason': str(e),
+            } for hash_ in hash_list])
 
     # Remove torrents
     def _remove_torrents(self):
+        if len(self._remove) == 0:
+            return
+        with self._pooled_client.lock:
+            self._remove_torrents_from_client()
+            # The other tasks need the remaining torrents
+            self._pooled_client.invalidate()
+
+    # Remove torrents from the client
+    def _remove_torrents_from_client(self):
         # Bulid a dict to store torrent hashes and names which to be deleted
         delete_list = {}
         for torrent in self._remove:
             delete_list[torrent.hash] = torrent.name
-        # Run deletion
-        success, failed = self._client.remove_torrents([hash_ for hash_ in delete_list], self._delete_data)
+        # Split the torrents into chunks
+        hashes = [hash_ for hash_ in delete_list]
+        chunks = [hashes[i:i+self._remove_chunk_size] for i in range(0, len(hashes), self._remove_chunk_size)]
+        # Run deletion, and retry the torrents which are failed to be removed
+        # The chunks are removed concurrently if the client verifies the removal with fresh requests,
+        # while uTorrent and Deluge verify it with their torrent list caches, which can't be updated concurrently
+        success = []
+        failed = []
+        fetcher = ConcurrentFetcher(self._concurrent_requests
+            if getattr(self._client, 'support_concurrent_removal', False) else 1,
+            transport=Transport.get(self._host))
+        for attempt in range(0, Task.REMOVE_RETRY+1):
+            retry_chunks = []
+            for chunk_success, chunk_failed in fetcher.map(self._remove_chunk, chunks):
+                success.extend(chunk_success)
+                if len(chunk_failed) > 0 and attempt < Task.REMOVE_RETRY:
+                    retry_chunks.append([torrent['hash'] for torrent in chunk_failed])
+                else:
+                    failed.extend(chunk_failed)
+            if len(retry_chunks) > 0:
+                self._logger.warning('Failed to remove %d torrent(s). Retrying...' %
+                    sum([len(chunk) for chunk in retry_chunks]))
+            chunks = retry_chunks
         # Output logs
         for hash_ in success:
             self._logger.info(
@@ -134,13 +306,32 @@ class Task(object):
             )
 
     # Execute
+    # The task can be executed repeatedly, and the client is kept logged in between the runs
     def execute(self):
         self._logger.info("Running task '%s'..." % self._name)
-        self._login()
-        self._get_torrents()
-        self._apply_strategies()
-        if self._enabled_remove:
-            self._remove_torrents()
+        # Strategies fill their configurations with defaults, so each run gets a copy
+        self._strategy_objects = [Strategy(name, dict(self._strategies[name])) for name in self._strategies]
+        self._torrents = set()
+        self._remove = set(self._force_delete)
+        try:
+            if self._client is None:
+                self._login()
+            # Get client status
+            # Nothing is requested until the strategies use it
+            self._client_status = self._client.client_status()
+            # The clients update the torrents of the other tasks in place and load the status lazily,
+            # so the torrents are fetched and checked without other tasks using the client
+            with self._pooled_client.lock:
+                self._get_torrents()
+                self._apply_strategies()
+            if self._enabled_remove:
+                self._remove_torrents()
+        except Exception:
+            # The connection may be broken, so we login again in the next run
+            if self._pooled_client is not None:
+                self._pooled_client.discard(self._client)
+            self._client = None
+            raise
 
     # Get remaining torrents (for tester)
     def get_remaining_torrents(self):
@@ -1,6 +1,6 @@
 #-*- coding:utf-8 -*-
 
-from .compatibility.urlparse_ import urlparse_
+from .util.hostname import tracker_hostname
 from .util.convertbytes import convert_bytes
 from .util.convertseconds import convert_seconds
 from .util.convertspeed import convert_speed
@@ -26,16 +26,16 @@ class Torrent(object):
                 return '(Not Provided)'
 
         return ("%s\n" +
-            "\tProgress:%.2f%%\tSize:%s\tRatio:%.3f\tTotal Uploaded:%s\n" +
-            "\tSeeder(connected/total):%d/%d\tLeecher(connected/total):%d/%d\tStatus:%s\n" +
+            "\tProgress:%s\tSize:%s\tRatio:%s\tTotal Uploaded:%s\n" +
+            "\tSeeder(connected/total):%s/%s\tLeecher(connected/total):%s/%s\tStatus:%s\n" +
             "\tDownload Speed:%s(Avg.:%s)\tUpload Speed:%s(Avg.:%s)\n" +
             "\tCreate Time:%s\tSeeding Time:%s\tDownloading Time:%s\tLast Activity:%s\n" +
             "\tCategory:%s\tTracker:%s") % \
             (
                 disp('name'),
-                disp('progress', lambda x: x*100),
+                disp('progress', lambda x: '%.2f%%' % (x*100)),
                 disp('size', convert_bytes),
-                disp('ratio'),
+                disp('ratio', lambda x: '%.3f' % x),
                 disp('uploaded', convert_bytes),
                 disp('connected_seeder'),
                 disp('seeder'),
@@ -53,7 +53,7 @@ class Torrent(object):
                 disp('category', ','.join),
                 disp('tracker', lambda t: \
                     ','.join(
-                        [urlparse_(x).hostname if urlparse_(x).hostname is not None else x for x in t]
+                        [tracker_hostname(x) or x for x in t]
                     )
                 ),
             )
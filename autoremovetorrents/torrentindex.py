@@ -0,0 +1,68 @@
+#-*- coding:utf-8 -*-
+from .torrentstatus import TorrentStatus
+
+# Indexes of the torrents by their attributes, so the filters needn't scan all the torrents
+# Each index is built when it's used for the first time,
+# because the torrents may not have the attributes no strategy needs
+class TorrentIndex(object):
+    def __init__(self, torrents):
+        self._torrents = torrents
+        self._categories = None # Category -> torrents
+        self._trackers = None # Tracker URL -> torrents
+        self._status = None # Status -> torrents
+        self._stalled = None # Status -> stalled torrents
+
+    # Add the torrent to the index under the key
+    @staticmethod
+    def _add(index, key, torrent):
+        if key not in index:
+            index[key] = set()
+        index[key].add(torrent)
+
+    # Get the torrents under any of the keys
+    @staticmethod
+    def _lookup(index, keys):
+        result = set()
+        for key in keys:
+            if key in index:
+                result.update(index[key])
+        return result
+
+    # Torrents in any of the categories accepted by the function
+    # The function is called once for each distinct category
+    def categories(self, match):
+        if self._categories is None:
+            self._categories = {}
+            for torrent in self._torrents:
+                for category in torrent.category:
+                    TorrentIndex._add(self._categories, category, torrent)
+        return TorrentIndex._lookup(self._categories,
+            [category for category in self._categories if match(category)])
+
+    # Torrents with any of the trackers accepted by the function
+    # The function is called once for each distinct tracker URL
+    def trackers(self, match):
+        if self._trackers is None:
+            self._trackers = {}
+            for torrent in self._torrents:
+                for tracker in torrent.tracker:
+                    TorrentIndex._add(self._trackers, tracker, torrent)
+        return TorrentIndex._lookup(self._trackers,
+            [tracker for tracker in self._trackers if match(tracker)])
+
+    # Torrents in any of the statuses
+    def status(self, status_list):
+        if self._status is None:
+            self._status = {}
+            for torrent in self._torrents:
+                TorrentIndex._add(self._status, torrent.status, torrent)
+        return TorrentIndex._lookup(self._status, status_list)
+
+    # Stalled torrents in any of the statuses (Uploading or Downloading)
+    def stalled(self, status_list):
+        if self._stalled is None:
+            self._stalled = {}
+            for torrent in self.status([TorrentStatus.Uploading, TorrentStatus.Downloading]):
+                if torrent.stalled:
+                    TorrentIndex._add(self._stalled, torrent.status, torrent)
+        return TorrentIndex._lookup(self._stalled, status_list)
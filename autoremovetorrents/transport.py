@@ -0,0 +1,141 @@
+#-*- coding:utf-8 -*-
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from . import logger
+from .exception.connectionfailure import ConnectionFailure
+
+class Transport(object):
+    # HTTP methods which are safe to retry
+    IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS']
+    # Responses which are worth retrying
+    RETRY_STATUS_CODES = [502, 503, 504]
+    # Delay before the first retry (in seconds), which is doubled for each retry
+    BACKOFF_FACTOR = 0.5
+    # The longest delay before a retry (in seconds)
+    MAX_BACKOFF = 10
+    # The circuit is opened after this number of consecutive failures
+    CIRCUIT_FAILURES = 5
+    # Time to keep the circuit open (in seconds)
+    CIRCUIT_RESET_TIME = 30
+    # Smoothing factor of the latency average
+    LATENCY_SMOOTHING = 0.2
+
+    # Transports of each host
+    _transports = {}
+    _transports_lock = threading.Lock()
+
+    def __init__(self, host, connect_timeout = 10, read_timeout = 60, retries = 3, pool_size = 10):
+        # Logger
+        self._logger = logger.Logger.register(__name__)
+
+        self._host = host
+        # Options
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.pool_size = pool_size
+
+        # Circuit breaker
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_time = None
+
+        # Latency statistics
+        self.requests = 0
+        self.latency = None
+
+    # Set the options of the host
+    # The state of the circuit breaker and the latency statistics are kept
+    @staticmethod
+    def configure(host, connect_timeout, read_timeout, retries, pool_size):
+        transport = Transport.get(host)
+        transport.connect_timeout = connect_timeout
+        transport.read_timeout = read_timeout
+        transport.retries = retries
+        transport.pool_size = pool_size
+
+    # Get the transport of the host (with default options if not configured)
+    @staticmethod
+    def get(host):
+        with Transport._transports_lock:
+            if host not in Transport._transports:
+                Transport._transports[host] = Transport(host)
+            return Transport._transports[host]
+
+    # Check whether requests can be sent
+    def check_circuit(self):
+        with self._lock:
+            if self._open_time is None:
+                return
+            if time.time() - self._open_time < Transport.CIRCUIT_RESET_TIME:
+                raise ConnectionFailure('Too many failed requests to %s. Try again later.' % self._host)
+            # Let one request try whether the host has recovered
+            self._open_time = time.time()
+
+    # Record a successful request
+    def record_success(self, latency):
+        with self._lock:
+            self._failures = 0
+            self._open_time = None
+            self.requests += 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += Transport.LATENCY_SMOOTHING * (latency - self.latency)
+
+    # Record a failed request
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= Transport.CIRCUIT_FAILURES:
+                if self._open_time is None:
+                    self._logger.warning('Too many failed requests to %s. Requests are paused for %d seconds.' %
+                        (self._host, Transport.CIRCUIT_RESET_TIME))
+                self._open_time = time.time()
+
+    # Delay before the retry
+    @staticmethod
+    def backoff(attempt):
+        delay = min(Transport.MAX_BACKOFF, Transport.BACKOFF_FACTOR * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+class HTTPSession(requests.Session):
+    def __init__(self, host):
+        requests.Session.__init__(self)
+        self._transport = Transport.get(host)
+
+        # Keep the connections alive in a pool
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self._transport.pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    # Send a request with timeouts, retries and the circuit breaker
+    # Requests of non-idempotent methods are retried only if idempotent=True is given
+    def request(self, method, url, *args, **kwargs):
+        idempotent = kwargs.pop('idempotent', method.upper() in Transport.IDEMPOTENT_METHODS)
+        kwargs.setdefault('timeout', (self._transport.connect_timeout, self._transport.read_timeout))
+        attempts = self._transport.retries + 1 if idempotent else 1
+
+        for attempt in range(0, attempts):
+            self._transport.check_circuit()
+            start_time = time.time()
+            try:
+                response = requests.Session.request(self, method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._transport.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            else:
+                if response.status_code not in Transport.RETRY_STATUS_CODES:
+                    self._transport.record_success(time.time() - start_time)
+                    return response
+                self._transport.record_failure()
+                if attempt == attempts - 1:
+                    return response
+                # Release the connection of the response we don't return
+                response.close()
+            time.sleep(Transport.backoff(attempt))
@@ -0,0 +1,53 @@
+#-*- coding:utf-8 -*-
+
+# A trie of domain rules, keyed by the labels from the top-level domain downwards,
+# so a hostname is matched in O(depth) whatever the number of rules
+#
+# Rules:
+#   tracker.example.org   Only this hostname
+#   *.example.org         Subdomains of example.org, but not example.org itself
+#   .example.org          example.org and its subdomains
+class DomainTrie(object):
+    # Keys of the flags in a node, which can't be domain labels
+    EXACT = '='
+    SUBDOMAINS = '*'
+
+    def __init__(self, rules = None):
+        self._root = {}
+        for rule in rules if rules is not None else []:
+            self.add(rule)
+
+    # Split the domain into labels from the top-level domain
+    @staticmethod
+    def _labels(domain):
+        return [label for label in reversed(domain.lower().split('.')) if len(label) > 0]
+
+    # Add a rule
+    def add(self, rule):
+        rule = str(rule)
+        flags = [DomainTrie.EXACT]
+        if rule.startswith('*.'):
+            rule = rule[2:]
+            flags = [DomainTrie.SUBDOMAINS]
+        elif rule.startswith('.'):
+            rule = rule[1:]
+            flags = [DomainTrie.EXACT, DomainTrie.SUBDOMAINS]
+        node = self._root
+        for label in DomainTrie._labels(rule):
+            node = node.setdefault(label, {})
+        for flag in flags:
+            node[flag] = True
+
+    # Check whether the hostname matches any rule
+    def match(self, hostname):
+        if hostname is None:
+            return False
+        node = self._root
+        for label in DomainTrie._labels(hostname):
+            # There are more labels, so the hostname is a subdomain of this node
+            if DomainTrie.SUBDOMAINS in node and node is not self._root:
+                return True
+            if label not in node:
+                return False
+            node = node[label]
+        return DomainTrie.EXACT in node
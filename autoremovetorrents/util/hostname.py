@@ -0,0 +1,22 @@
+#-*- coding:utf-8 -*-
+import sys
+from ..compatibility.urlparse_ import urlparse_
+
+# Hostnames of the tracker URLs we have parsed
+# Torrents share a few trackers, so each distinct URL is parsed only once
+_hostnames = {}
+# Parsed URLs to keep at most
+MAX_CACHED_HOSTNAMES = 100000
+
+# Get the hostname of the tracker URL (None if it has no hostname)
+# The hostnames are interned, so they are compared and hashed quickly
+def tracker_hostname(url):
+    if url in _hostnames:
+        return _hostnames[url]
+    if len(_hostnames) >= MAX_CACHED_HOSTNAMES:
+        _hostnames.clear()
+    hostname = urlparse_(url).hostname
+    if hostname is not None:
+        hostname = sys.intern(hostname)
+    _hostnames[url] = hostname
+    return hostname
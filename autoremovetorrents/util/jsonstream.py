@@ -0,0 +1,213 @@
+#-*- coding:utf-8 -*-
+import json
+
+# ijson parses the response while it's being received (with its C backend if available),
+# but in case it's not installed, we decode each element with the json module.
+try:
+    import ijson
+    SUPPORT_IJSON = True
+    # Errors of invalid JSON, which are raised as ValueError like the json module does
+    IJSON_ERRORS = (ijson.JSONError,)
+except ImportError:
+    SUPPORT_IJSON = False
+    IJSON_ERRORS = ()
+
+# Decode the elements of an array in a JSON response one by one,
+# so that the whole body and the decoded array are never held in memory at the same time
+#
+# The path is the list of keys to the array, e.g. ['arguments', 'torrents'].
+# The rest of the document, in which the array is empty, is available
+# in the attribute 'document' after the iteration.
+# If the array is not in the document (e.g. an error response), there are no elements.
+# The response is closed when the iteration ends, and invalid JSON raises ValueError.
+class JSONArrayStream(object):
+    # Size of each chunk read from the response
+    CHUNK_SIZE = 65536
+    # Brackets of the container
+    OPENING = '['
+    CLOSING = ']'
+
+    def __init__(self, response, path):
+        self._response = response
+        self._path = path
+        self.document = None
+
+    def __iter__(self):
+        try:
+            for item in self._ijson_items() if SUPPORT_IJSON else self._json_items():
+                yield item
+        except IJSON_ERRORS as e:
+            raise ValueError(str(e))
+        finally:
+            self._response.close()
+
+    # Decode the elements with ijson
+    def _ijson_items(self):
+        self._response.raw.decode_content = True # Decompress gzip responses
+        item_prefix = '.'.join(self._path + ['item'])
+        document_builder = ijson.ObjectBuilder()
+        item_builder = None
+        for prefix, event, value in ijson.parse(self._response.raw, use_float=True):
+            if item_builder is not None: # In an element
+                item_builder.event(event, value)
+                if prefix == item_prefix and event in ('end_map', 'end_array'):
+                    yield item_builder.value
+                    item_builder = None
+            elif prefix == item_prefix: # Beginning of an element
+                if event in ('start_map', 'start_array'):
+                    item_builder = ijson.ObjectBuilder()
+                    item_builder.event(event, value)
+                else:
+                    yield value
+            else:
+                document_builder.event(event, value)
+        self.document = document_builder.value
+
+    # Decode the elements with the json module
+    def _json_items(self):
+        if self._response.encoding is None:
+            self._response.encoding = 'utf-8'
+        chunks = self._response.iter_content(JSONArrayStream.CHUNK_SIZE, decode_unicode=True)
+        decoder = json.JSONDecoder()
+
+        # Find the container and keep the text before it
+        prefix, buffer = JSONArrayStream._find_container(chunks, self._path, self.OPENING)
+        if buffer is None: # The whole document is read
+            self.document = json.loads(prefix)
+            return
+        pos = 0
+        eof = False
+        while True:
+            # Skip whitespaces and separators
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError('Unexpected end of the JSON container.')
+                buffer = buffer[pos:] + next(chunks, '')
+                pos = 0
+                eof = len(buffer) == 0
+                continue
+            if buffer[pos] == self.CLOSING: # End of the container
+                break
+            try:
+                # The elements are objects or arrays,
+                # which can't be decoded until they are complete
+                item, pos = self._decode_item(decoder, buffer, pos)
+            except ValueError:
+                chunk = next(chunks, '')
+                if len(chunk) == 0:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+        # Decode the rest of the document with an empty container
+        self.document = json.loads(prefix + self.OPENING + buffer[pos:] + ''.join(chunks))
+
+    # Decode the element at the position
+    # Returns the element and the position after it
+    def _decode_item(self, decoder, buffer, pos):
+        return decoder.raw_decode(buffer, pos)
+
+    # Find the beginning of the container in the path
+    # Returns the text before the container and the text after its opening bracket,
+    # or the whole text and None if the container is not found
+    @staticmethod
+    def _find_container(chunks, path, opening):
+        text = ''
+        pos = 0
+        containers = [] # Types of the containers we are in, and their keys in the parents
+        key = None # The last key read in the current object
+        expect_key = False
+        for chunk in chunks:
+            text += chunk
+            while pos < len(text):
+                char = text[pos]
+                if char == '"':
+                    end = JSONArrayStream._string_end(text, pos)
+                    if end < 0: # Read the rest of the string
+                        break
+                    if expect_key:
+                        key = json.loads(text[pos:end])
+                        expect_key = False
+                    pos = end
+                    continue
+                if char in '[{':
+                    parent_is_object = len(containers) > 0 and containers[-1][0] == '{'
+                    containers.append((char, key if parent_is_object else None))
+                    if char == opening and [k for _, k in containers[1:]] == path:
+                        return (text[:pos], text[pos+1:])
+                    expect_key = char == '{'
+                elif char in ']},' and len(containers) == 0: # e.g. an HTML error page
+                    raise ValueError('The response is not a JSON document.')
+                elif char in ']}':
+                    containers.pop()
+                elif char == ',':
+                    expect_key = containers[-1][0] == '{'
+                pos += 1
+        return (text, None)
+
+    # Find the end of the string which begins at the position
+    # Returns -1 if the string is incomplete
+    @staticmethod
+    def _string_end(text, pos):
+        end = pos
+        while True:
+            end = text.find('"', end + 1)
+            if end < 0:
+                return -1
+            # The quote is escaped if there are odd backslashes before it
+            backslashes = 0
+            while text[end - 1 - backslashes] == '\\':
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end + 1
+
+# Decode the members of an object in a JSON response one by one, like JSONArrayStream
+# The members are yielded as (key, value), and the values are objects or arrays
+class JSONObjectStream(JSONArrayStream):
+    # Brackets of the container
+    OPENING = '{'
+    CLOSING = '}'
+
+    # Decode the members with ijson
+    def _ijson_items(self):
+        self._response.raw.decode_content = True # Decompress gzip responses
+        object_prefix = '.'.join(self._path)
+        document_builder = ijson.ObjectBuilder()
+        item_builder = None
+        depth = 0 # Depth of the containers in the value
+        for prefix, event, value in ijson.parse(self._response.raw, use_float=True):
+            if item_builder is not None: # In a value
+                item_builder.event(event, value)
+                if event in ('start_map', 'start_array'):
+                    depth += 1
+                elif event in ('end_map', 'end_array'):
+                    depth -= 1
+                if depth == 0:
+                    yield (key, item_builder.value)
+                    item_builder = None
+            elif prefix == object_prefix and event == 'map_key': # Beginning of a member
+                key = value
+                item_builder = ijson.ObjectBuilder()
+            else:
+                document_builder.event(event, value)
+        self.document = document_builder.value
+
+    # Decode the member at the position
+    def _decode_item(self, decoder, buffer, pos):
+        key, pos = decoder.raw_decode(buffer, pos)
+        pos = JSONObjectStream._skip_spaces(buffer, pos)
+        if pos >= len(buffer) or buffer[pos] != ':':
+            raise ValueError('Expecting a colon after the key.')
+        value, pos = decoder.raw_decode(buffer, JSONObjectStream._skip_spaces(buffer, pos + 1))
+        return ((key, value), pos)
+
+    # Skip the whitespaces from the position
+    @staticmethod
+    def _skip_spaces(buffer, pos):
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+        return pos
@@ -0,0 +1,89 @@
+#-*- coding:utf-8 -*-
+import fnmatch
+import re
+import threading
+from ..exception.invalidpattern import InvalidPattern
+
+# Match strings against a list of patterns
+# The glob patterns are compiled into one regular expression, while each regular expression
+# is compiled on its own, so their groups and backreferences don't affect each other
+#
+# Patterns:
+#   Movies         Only this string
+#   TV-*, ?-Music  Glob patterns, if there is a '*' or '?' ('[seq]' is supported in them)
+#   re:^HD         Regular expressions, which match any part of the string
+#
+# A string is matched only once and the result is remembered,
+# since the torrents share a few categories.
+class PatternMatcher(object):
+    # Prefix of regular expressions
+    REGEX_PREFIX = 're:'
+    # Characters which make a glob pattern
+    GLOB_CHARACTERS = '*?'
+    # Results to remember at most
+    MAX_CACHED_RESULTS = 100000
+
+    # Matchers of each pattern list, so they are compiled only once in a process
+    _matchers = {}
+    _matchers_lock = threading.Lock()
+
+    def __init__(self, patterns):
+        patterns = [str(pattern) for pattern in patterns]
+        # Plain strings are looked up directly
+        self._literals = set(patterns)
+        # Compile the glob patterns into one expression
+        globs = [fnmatch.translate(pattern) for pattern in patterns
+            if not PatternMatcher.is_literal(pattern) and not pattern.startswith(PatternMatcher.REGEX_PREFIX)]
+        self._glob = re.compile('|'.join(['(?:%s)' % glob for glob in globs])) \
+            if len(globs) > 0 else None
+        # Compile the regular expressions
+        self._regex = [PatternMatcher._compile(pattern) for pattern in patterns
+            if pattern.startswith(PatternMatcher.REGEX_PREFIX)]
+        # Results of the strings matched before
+        self._results = {}
+
+    # Get the matcher of the patterns
+    @staticmethod
+    def get(patterns):
+        key = tuple([str(pattern) for pattern in patterns])
+        with PatternMatcher._matchers_lock:
+            if key not in PatternMatcher._matchers:
+                PatternMatcher._matchers[key] = PatternMatcher(key)
+            return PatternMatcher._matchers[key]
+
+    # Check whether the pattern only matches itself
+    @staticmethod
+    def is_literal(pattern):
+        pattern = str(pattern)
+        return not pattern.startswith(PatternMatcher.REGEX_PREFIX) and \
+            not any([c in pattern for c in PatternMatcher.GLOB_CHARACTERS])
+
+    # Compile the regular expression of the pattern
+    @staticmethod
+    def _compile(pattern):
+        try:
+            return re.compile(pattern[len(PatternMatcher.REGEX_PREFIX):])
+        except re.error as e:
+            raise InvalidPattern("The pattern '%s' is invalid: %s." % (pattern, str(e)))
+
+    # Check the string with the patterns
+    def _match(self, string):
+        if self._glob is not None and self._glob.match(string) is not None:
+            return True
+        for regex in self._regex:
+            # Regular expressions match any part of the string
+            if regex.search(string) is not None:
+                return True
+        return False
+
+    # Check whether the string matches any of the patterns
+    def match(self, string):
+        if string in self._literals:
+            return True
+        if self._glob is None and len(self._regex) == 0:
+            return False
+        if string not in self._results:
+            if len(self._results) >= PatternMatcher.MAX_CACHED_RESULTS:
+                self._results.clear()
+            self._results[string] = self._match(string)
+        return self._results[string]
@@ -0,0 +1,58 @@
+import json
+import requests_mock
+from autoremovetorrents import logger
+from autoremovetorrents.main import pre_processor
+
+def test_daemon(requests_mock, mocker, tmp_path):
+    logger.Logger.init()
+
+    # Mock a Transmission daemon
+    # The torrent list fails in the first run, so the task logs in again in the next run
+    host = 'http://transmission-daemon'
+    torrents = {'h1': {'id': 1, 'hashString': 'h1', 'name': 'Torrent 1', 'uploadRatio': 1.0}}
+    methods = []
+    runs = [] # Methods called before the end of each run
+    def rpc(request, context):
+        body = request.json()
+        methods.append(body['method'])
+        arguments = {}
+        if body['method'] == 'session-get':
+            arguments = {'version': '3.00', 'rpc-version': 15}
+        elif body['method'] == 'torrent-get':
+            if len(runs) == 0:
+                context.status_code = 500
+                return {}
+            ids = body['arguments'].get('ids')
+            arguments = {'torrents': [torrent for hash_, torrent in torrents.items()
+                if not isinstance(ids, list) or hash_ in ids]}
+        elif body['method'] == 'torrent-remove':
+            for hash_ in body['arguments']['ids']:
+                torrents.pop(hash_, None)
+        return {'result': 'success', 'arguments': arguments, 'tag': body['tag']}
+    requests_mock.post(host+'/transmission/rpc', json=rpc)
+
+    conf = tmp_path / 'config.yml'
+    conf.write_text(json.dumps({'task': {
+        'client': 'transmission', 'host': host, 'username': 'admin', 'password': 'admin',
+        'concurrent_requests': 1, 'strategies': {'s': {'ratio': 5}},
+    }}))
+
+    # Run three times, and the torrent reaches the ratio before the last run
+    class Stop(object):
+        def set(self):
+            pass
+        def wait(self, timeout):
+            runs.append(list(methods))
+            if len(runs) == 2:
+                torrents['h1']['uploadRatio'] = 6.0
+            return len(runs) == 3
+    mocker.patch('threading.Event', Stop)
+    mocker.patch('signal.signal')
+    pre_processor(['-c', str(conf), '-l', str(tmp_path), '--daemon', '--interval', '0'])
+
+    # Logged in again after the failure
+    assert runs[0] == ['session-get'] + ['torrent-get'] * 3
+    assert runs[1][len(runs[0]):] == ['session-get', 'torrent-get']
+    # The torrents are fetched again in the next run, and the strategy still applies
+    assert runs[2][len(runs[1]):] == ['torrent-get', 'torrent-remove', 'torrent-get']
+    assert len(torrents) == 0
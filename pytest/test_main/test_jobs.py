@@ -0,0 +1,72 @@
+import json
+import threading
+from autoremovetorrents import logger
+from autoremovetorrents.main import pre_processor
+from autoremovetorrents.task import Task
+
+def test_jobs(requests_mock, mocker, tmp_path):
+    logger.Logger.init()
+
+    # The tasks wait for each other after logging in, so their logs would be interleaved without buffering
+    # (The mocked responses are made one at a time, so they can't wait)
+    barrier = threading.Barrier(3, timeout=10)
+    get_torrents = Task._get_torrents
+    def wait_and_get_torrents(task):
+        barrier.wait()
+        get_torrents(task)
+    mocker.patch.object(Task, '_get_torrents', autospec=True, side_effect=wait_and_get_torrents)
+
+    # Mock a Transmission daemon on each host
+    torrents = {}
+    def mock_transmission(host, name, fails):
+        torrents[host] = {'h1': {'id': 1, 'hashString': 'h1', 'name': name, 'uploadRatio': 6.0}}
+        def rpc(request, context):
+            body = request.json()
+            arguments = {}
+            if body['method'] == 'session-get':
+                arguments = {'version': '3.00', 'rpc-version': 15}
+            elif body['method'] == 'torrent-get':
+                if fails:
+                    context.status_code = 500
+                    return {}
+                ids = body['arguments'].get('ids')
+                arguments = {'torrents': [torrent for hash_, torrent in torrents[host].items()
+                    if not isinstance(ids, list) or hash_ in ids]}
+            elif body['method'] == 'torrent-remove':
+                for hash_ in body['arguments']['ids']:
+                    torrents[host].pop(hash_, None)
+            return {'result': 'success', 'arguments': arguments, 'tag': body['tag']}
+        requests_mock.post(host+'/transmission/rpc', json=rpc)
+        return {'client': 'transmission', 'host': host, 'username': 'admin', 'password': 'admin',
+            'strategies': {'s': {'ratio': 5}}}
+
+    conf = tmp_path / 'config.yml'
+    conf.write_text(json.dumps({
+        'task_a': mock_transmission('http://transmission-jobs-a', 'Torrent A', False),
+        'task_b': mock_transmission('http://transmission-jobs-b', 'Torrent B', False),
+        'task_c': mock_transmission('http://transmission-jobs-c', 'Torrent C', True),
+    }))
+    pre_processor(['-c', str(conf), '-l', str(tmp_path), '--jobs', '3'])
+
+    # All the tasks have run, and the failing one doesn't affect the others
+    assert [len(torrents[host]) for host in sorted(torrents)] == [0, 0, 1]
+
+    # The logs of each task are written together
+    blocks = {}
+    task_name = None
+    for log_file in tmp_path.glob('autoremove.*.log'):
+        for line in log_file.read_text().splitlines():
+            if "Running task '" in line:
+                task_name = line.split("'")[1]
+            if task_name is not None:
+                blocks.setdefault(task_name, []).append(line)
+    assert sorted(blocks) == ['task_a', 'task_b', 'task_c']
+    for task_name, name in [('task_a', 'Torrent A'), ('task_b', 'Torrent B')]:
+        block = '\n'.join(blocks[task_name])
+        assert 'Login successfully' in block
+        assert 'The torrent %s has been removed.' % name in block
+        assert 'fails' not in block
+    block = '\n'.join(blocks['task_c'])
+    assert 'Login successfully' in block
+    assert 'Task task_c fails.' in block
+    assert 'has been removed' not in block
@@ -1,6 +1,7 @@
 import os
 import json
 import pytest
+import requests
 import requests_mock
 import sys
 
@@ -22,4 +23,84 @@ def qbittorrent_mocker(requests_mock):
                 requests_mock.get(url, **mocks[url])
                 requests_mock.post(url, **mocks[url])
 
-    return runner
\ No newline at end of file
+    return runner
+
+@pytest.fixture(scope="function")
+def qbittorrent_v2_torrent():
+    # Make a torrent of the qBittorrent API v2
+    def maker(hash_, name, category='', tracker='', state='uploading', ratio=1.0):
+        return {
+            'hash': hash_, 'name': name, 'category': category, 'tracker': tracker, 'state': state,
+            'size': 1024, 'ratio': ratio, 'progress': 1, 'last_activity': 1547136801,
+            'added_on': 1547136801, 'dlspeed': 0, 'downloaded': 1024, 'num_complete': 10,
+            'num_incomplete': 1, 'num_leechs': 0, 'num_seeds': 1, 'seeding_time': 3600,
+            'time_active': 7200, 'uploaded': 1024, 'upspeed': 0,
+        }
+
+    return maker
+
+@pytest.fixture(scope="function")
+def qbittorrent_v2_mocker(requests_mock):
+    # Mock a qBittorrent with API v2
+    # maindata is a list of responses of sync/maindata, and trackers are the tracker URLs of each torrent
+    def runner(host, maindata, trackers=None, torrents_info=None):
+        requests_mock.get(host+'/api/v2/app/webapiVersion', text='2.8.3')
+        requests_mock.get(host+'/api/v2/app/version', text='v4.5.0')
+        requests_mock.post(host+'/api/v2/auth/login', text='Ok.')
+        requests_mock.get(host+'/api/v2/sync/maindata', [{'json': data} for data in maindata])
+        requests_mock.get(host+'/api/v2/torrents/info', json=torrents_info if torrents_info is not None else [])
+        requests_mock.post(host+'/api/v2/torrents/delete', text='')
+        for hash_, urls in (trackers or {}).items():
+            requests_mock.get(host+'/api/v2/torrents/trackers?hash='+hash_,
+                json=[{'url': url} for url in ['** [DHT] **'] + urls])
+        return requests_mock
+
+    return runner
+
+@pytest.fixture(scope="function")
+def transmission_mocker(requests_mock):
+    # Mock a Transmission RPC server
+    # The handler returns the arguments of the response to a method
+    def runner(host, handler, session_id='session-1', username='admin', password='admin'):
+        def rpc(request, context):
+            if request.headers.get('X-Transmission-Session-Id') != session_id:
+                context.status_code = 409
+                context.headers['X-Transmission-Session-Id'] = session_id
+                return {}
+            if request.headers.get('Authorization') != requests.auth._basic_auth_str(username, password):
+                context.status_code = 401
+                return {}
+            body = request.json()
+            return {'result': 'success', 'arguments': handler(body['method'], body['arguments']), 'tag': body['tag']}
+        requests_mock.post(host+'/transmission/rpc', json=rpc)
+        return requests_mock
+
+    return runner
+
+@pytest.fixture(scope="function")
+def utorrent_torrent():
+    # Make a torrent in the list of uTorrent
+    # (The hashes are in lower case, since requests_mock lowers the queries)
+    def maker(hash_, name, label='', ratio=1000):
+        return [hash_, 201, name, 1024, 1000, 1024, 1024, ratio, 0, 0, 0, label, 0, 1, 0, 10, 65536, -1, 0]
+
+    return maker
+
+@pytest.fixture(scope="function")
+def utorrent_mocker(requests_mock):
+    # Mock a uTorrent WebUI
+    # lists is the responses of the torrents list, and trackers are the trackers of each torrent
+    def runner(host, lists, trackers=None):
+        def getprops(request, context):
+            return {'build': 46229, 'props': [{
+                'hash': hash_, 'trackers': '\r\n'.join((trackers or {}).get(hash_, [])),
+                'ulrate': 0, 'dlrate': 0,
+            } for hash_ in request.qs['hash']]}
+        requests_mock.get(host+'/gui/token.html', text="<html><div id='token'>token-1</div></html>")
+        requests_mock.get(host+'/gui/?list=1', [{'json': data} for data in lists])
+        requests_mock.get(host+'/gui/?action=getprops', json=getprops)
+        requests_mock.get(host+'/gui/?action=remove', json={'build': 46229})
+        requests_mock.get(host+'/gui/?action=removedata', json={'build': 46229})
+        return requests_mock
+
+    return runner
@@ -0,0 +1,217 @@
+import socket
+import struct
+import threading
+import zlib
+import pytest
+from deluge_client.client import InvalidHeaderException, RPC_RESPONSE
+from deluge_client.rencode import dumps
+from autoremovetorrents import logger
+from autoremovetorrents.strategy import Strategy
+from autoremovetorrents.task import Task
+from autoremovetorrents.client.deluge import Deluge, DelugeConnection
+from autoremovetorrents.exception.nosuchtorrent import NoSuchTorrent
+from autoremovetorrents.torrentstatus import TorrentStatus
+
+# A socket which receives the given data
+class FakeSocket(object):
+    def __init__(self, data):
+        self._data = data
+
+    def recv(self, size):
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+# A client of Deluge 2 which can't be connected
+class FakeClient(object):
+    def __init__(self, data=b''):
+        self.deluge_version = 2
+        self.deluge_protocol_version = 1
+        self.request_id = 0
+        self._socket = FakeSocket(data)
+
+    def _send_call(self, deluge_version, protocol_version, method, *args):
+        self.request_id += 1
+
+    def reconnect(self):
+        raise socket.error('Connection refused')
+
+# Make a response message of Deluge 2
+def message(header, request_id, result):
+    body = zlib.compress(dumps((RPC_RESPONSE, request_id, result)))
+    return struct.pack('!BI', header, len(body)) + body
+
+# A client of Deluge whose daemon is replaced by the handler
+# The handler takes the method and its arguments, and returns the result
+def deluge_client(mocker, handler):
+    client = Deluge('deluge-fake')
+    client._connection = DelugeConnection(FakeClient())
+    client._client = client._connection.client
+    mocker.patch.object(client._connection, 'call_many',
+        side_effect=lambda calls: [handler(method, *args) for method, args in calls])
+    return client
+
+# The arguments of each call of the method
+def calls_of(connection, method):
+    return [args for call in connection.call_many.call_args_list
+        for call_method, args in call[0][0] if call_method == method]
+
+def test_receive_message():
+    connection = DelugeConnection(FakeClient())
+    data = message(1, 1, 'a') + message(1, 2, 'b')
+    assert connection._receive_message(data) == ([RPC_RESPONSE, 1, 'a'], message(1, 2, 'b'))
+
+    # The reply of another protocol
+    with pytest.raises(InvalidHeaderException):
+        connection._receive_message(message(2, 1, 'a'))
+
+def test_broken_connection_is_evicted():
+    key = ('deluge-broken', 58846, 'admin', 'admin')
+    connection = DelugeConnection(FakeClient(message(2, 1, 'a')))
+    DelugeConnection._connections[key] = connection
+
+    # It fails to reconnect, so the next login connects again
+    with pytest.raises(socket.error):
+        connection.call_many([('daemon.get_version', ())])
+    assert key not in DelugeConnection._connections
+
+def test_diff_merged_into_cache(mocker):
+    diffs = [
+        {
+            'h1': {'hash': 'h1', 'name': 'Torrent 1', 'ratio': 1.0},
+            'h2': {'hash': 'h2', 'name': 'Torrent 2', 'ratio': 2.0},
+            'h3': {'hash': 'h3', 'name': 'Torrent 3', 'ratio': 3.0},
+        },
+        {'h1': {'ratio': 1.5}, 'h2': {}, 'h3': {}}, # Only the ratio of h1 has changed
+        {'h1': {}, 'h2': {}}, # h3 has been removed
+    ]
+    client = deluge_client(mocker, lambda method, *args: diffs.pop(0))
+
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2', 'h3']
+    torrent_1 = client.torrent_properties('h1')
+    torrent_2 = client.torrent_properties('h2')
+    assert (torrent_1.ratio, torrent_2.ratio) == (1.0, 2.0)
+
+    # The changed torrent is rebuilt from the merged properties, and the others are reused
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2', 'h3']
+    assert client.torrent_properties('h1') is not torrent_1
+    assert (client.torrent_properties('h1').name, client.torrent_properties('h1').ratio) == ('Torrent 1', 1.5)
+    assert client.torrent_properties('h2') is torrent_2
+
+    # The removed torrent is pruned in an unfiltered refresh
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2']
+    assert sorted(client._connection.torrent_cache) == ['h1', 'h2']
+    with pytest.raises(NoSuchTorrent):
+        client.torrent_properties('h3')
+
+    # The differences are tracked by the daemon
+    assert [args[2] for args in calls_of(client._connection, 'core.get_torrents_status')] == [True, True, True]
+
+def test_filtered_refresh_keeps_cache(mocker):
+    def handler(method, filter_dict, keys, diff):
+        if filter_dict.get('state') == ['Seeding']:
+            return {'h1': {'state': 'Seeding'}}
+        return {
+            'h1': {'hash': 'h1', 'name': 'Torrent 1', 'state': 'Paused'},
+            'h2': {'hash': 'h2', 'name': 'Torrent 2', 'state': 'Paused'},
+        }
+    client = deluge_client(mocker, handler)
+
+    assert sorted(client.torrents_list(['status'])) == ['h1', 'h2']
+    torrent_2 = client.torrent_properties('h2')
+
+    # The torrents out of the filter are not listed, but they are kept in the cache
+    assert client.torrents_list(['status'], {'status': set([TorrentStatus.Uploading])}) == ['h1']
+    assert client.torrent_properties('h1').status == TorrentStatus.Uploading
+    assert sorted(client._connection.torrent_cache) == ['h1', 'h2']
+    assert client.torrent_properties('h2') is torrent_2
+
+def test_filter_dict(mocker):
+    logger.Logger.init()
+
+    plugins = [['Label']]
+    client = deluge_client(mocker, lambda method, *args: plugins[0])
+
+    # Each status is mapped to the states of Deluge
+    assert client._filter_dict({'status': set([TorrentStatus.Uploading, TorrentStatus.Unknown])}) == \
+        {'state': ['Allocating', 'Moving', 'Seeding']}
+
+    # Numeric categories in YAML are sent as the names of labels
+    filters = Strategy('s', {'categories': [2023, 'movies']}).accepted_values()
+    assert client._filter_dict(filters) == {'label': ['2023', 'movies']}
+    # The enabled plugins are only checked once
+    plugins[0] = []
+    assert client._filter_dict(filters) == {'label': ['2023', 'movies']}
+    assert len(calls_of(client._connection, 'core.get_enabled_plugins')) == 1
+
+    # Labels are not filtered by the daemon without the plugin
+    client = deluge_client(mocker, lambda method, *args: [])
+    assert client._filter_dict(filters) == {}
+
+def test_exclusions_after_daemon_filters(mocker):
+    logger.Logger.init()
+
+    torrents = {
+        'h1': {'hash': 'h1', 'name': 'Torrent 1', 'label': 'movies', 'state': 'Seeding', 'ratio': 2.0},
+        'h2': {'hash': 'h2', 'name': 'Keep this', 'label': 'movies', 'state': 'Seeding', 'ratio': 2.0},
+    }
+    def handler(method, *args):
+        if method == 'daemon.get_version':
+            return '2.1.1'
+        if method == 'core.get_enabled_plugins':
+            return ['Label']
+        if method == 'core.remove_torrents':
+            for torrent in args[0]:
+                torrents.pop(torrent)
+            return []
+        if method == 'core.get_torrents_status':
+            if 'id' in args[0]:
+                return dict([(h, {'hash': h}) for h in args[0]['id'] if h in torrents])
+            return dict([(h, torrent) for h, torrent in torrents.items()
+                if torrent['label'] in args[0].get('label', [torrent['label']])])
+    connection = DelugeConnection(FakeClient())
+    mocker.patch.object(connection, 'call_many',
+        side_effect=lambda calls: [handler(method, *args) for method, args in calls])
+    mocker.patch.object(DelugeConnection, 'get', return_value=connection)
+
+    task = Task('deluge_filters', {'client': 'deluge', 'host': 'deluge-filters:58846',
+        'username': 'admin', 'password': 'admin', 'strategies': {'s': {
+            'categories': ['movies'], 'excluded_names': ['Keep*'], 'ratio': 1,
+        }}}, True)
+    task.execute()
+
+    # The daemon selects the label, and the excluded names are still kept by the strategy
+    filters = [args[0] for args in calls_of(connection, 'core.get_torrents_status') if 'id' not in args[0]]
+    assert filters == [{'label': ['movies']}]
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h1']
+    assert list(torrents) == ['h2']
+
+def test_connect_without_blocking_others(mocker):
+    # Connecting to the slow daemon doesn't finish until the other daemon is connected
+    connecting = threading.Event()
+    connected = threading.Event()
+    connects = []
+    class RPCClient(FakeClient):
+        def __init__(self, host, port, username, password, decode_utf8):
+            FakeClient.__init__(self)
+            self.host = host
+        def connect(self):
+            connects.append(self.host)
+            if self.host == 'deluge-slow':
+                connecting.set()
+                assert connected.wait(10)
+    mocker.patch('autoremovetorrents.client.deluge.DelugeRPCClient', RPCClient)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        DelugeConnection.get('deluge-slow', 58846, 'admin', 'admin'))) for i in range(0, 2)]
+    for thread in threads:
+        thread.start()
+    assert connecting.wait(10)
+    DelugeConnection.get('deluge-fast', 58846, 'admin', 'admin')
+    connected.set()
+    for thread in threads:
+        thread.join()
+
+    # The tasks on the slow daemon share its connection
+    assert sorted(connects) == ['deluge-fast', 'deluge-slow']
+    assert len(results) == 2 and results[0] is results[1]
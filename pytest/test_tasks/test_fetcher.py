@@ -0,0 +1,35 @@
+from autoremovetorrents import logger
+from autoremovetorrents.fetcher import ConcurrentFetcher
+
+def test_worker_logs_are_buffered():
+    logger.Logger.init()
+    lg = logger.Logger.register('test_fetcher')
+
+    def fetch(item):
+        lg.info('Fetching %d...' % item)
+        return item * 2
+
+    # The records of the worker threads are held back with the ones of the task
+    logger.Logger.start_buffering()
+    try:
+        assert list(ConcurrentFetcher(4).map(fetch, range(0, 8))) == list(range(0, 16, 2))
+        messages = [record.getMessage() for handler, record in logger.Logger.buffer()
+            if handler is logger.Logger.console_handler]
+    finally:
+        logger.Logger.flush_buffer()
+    assert sorted(messages) == sorted(['Fetching %d...' % item for item in range(0, 8)])
+
+def test_limit_follows_transport_latency():
+    logger.Logger.init()
+
+    # The calls are answered at once, but the HTTP requests get slower
+    class FakeTransport(object):
+        latency = 0.1
+    transport = FakeTransport()
+    fetcher = ConcurrentFetcher(4, transport=transport)
+    for _ in range(0, 10):
+        fetcher._adjust(0, False)
+    assert fetcher.limit == 4
+    transport.latency = 1
+    fetcher._adjust(0, False)
+    assert fetcher.limit == 3
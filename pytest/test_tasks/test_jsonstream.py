@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+import io
+import json
+import pytest
+from autoremovetorrents.util import jsonstream
+from autoremovetorrents.util.jsonstream import JSONArrayStream, JSONObjectStream
+
+# A streamed response which is received in chunks of the size
+class FakeResponse(object):
+    def __init__(self, text, chunk_size):
+        self._text = text
+        self._chunk_size = chunk_size
+        self.encoding = 'utf-8'
+        self.raw = io.BytesIO(text.encode('utf-8'))
+        self.closed = False
+
+    def iter_content(self, chunk_size, decode_unicode):
+        for i in range(0, len(self._text), self._chunk_size):
+            yield self._text[i:i+self._chunk_size]
+
+    def close(self):
+        self.closed = True
+
+DOCUMENT = {
+    'arguments': {
+        'torrents': [
+            {'name': 'A "quoted" name \\ with [brackets] and {braces}', 'id': 1},
+            {'name': u'中文 \\"', 'id': 2, 'trackers': [{'announce': 'http://a/'}]},
+            ['table', 'row', '"]"'],
+        ],
+        'removed': [3, 4],
+    },
+    'result': 'success',
+    'tag': '"torrents":[',
+}
+
+@pytest.fixture(params=['json', 'ijson'])
+def backend(request, monkeypatch):
+    if request.param == 'ijson':
+        pytest.importorskip('ijson')
+    monkeypatch.setattr(jsonstream, 'SUPPORT_IJSON', request.param == 'ijson')
+
+def test_chunk_boundaries(backend):
+    text = json.dumps(DOCUMENT)
+    # Split the elements, strings and escapes at every position
+    for chunk_size in range(1, len(text) + 1):
+        response = FakeResponse(text, chunk_size)
+        stream = JSONArrayStream(response, ['arguments', 'torrents'])
+        assert list(stream) == DOCUMENT['arguments']['torrents']
+        assert stream.document == dict(DOCUMENT, arguments={'torrents': [], 'removed': [3, 4]})
+        assert response.closed
+
+def test_missing_array(backend):
+    # An error response without the array
+    response = FakeResponse('{"arguments": {}, "result": "no such method"}', 7)
+    stream = JSONArrayStream(response, ['arguments', 'torrents'])
+    assert list(stream) == []
+    assert stream.document == {'arguments': {}, 'result': 'no such method'}
+
+def test_invalid_json(backend):
+    response = FakeResponse('{"arguments": {"torrents": [{"id": 1}, {"id": ', 7)
+    with pytest.raises(ValueError):
+        list(JSONArrayStream(response, ['arguments', 'torrents']))
+    assert response.closed
+
+def test_not_json(backend):
+    # An error page of a proxy
+    for text in ['<html><body>502 Bad Gateway, [nginx]</body></html>', '<p>Not found</p>']:
+        response = FakeResponse(text, 7)
+        with pytest.raises(ValueError):
+            list(JSONArrayStream(response, ['arguments', 'torrents']))
+        assert response.closed
+
+def test_object_chunk_boundaries(backend):
+    document = {
+        'rid': 1,
+        'torrents': {
+            'h1': {'name': 'A "quoted" name \\ with {braces}', 'ratio': 1.5},
+            'h:2': {'name': u'中文 \\"', 'trackers': ['}']},
+        },
+        'server_state': {'free_space_on_disk': 1024},
+    }
+    text = json.dumps(document, indent=1)
+    for chunk_size in range(1, len(text) + 1):
+        response = FakeResponse(text, chunk_size)
+        stream = JSONObjectStream(response, ['torrents'])
+        assert dict(stream) == document['torrents']
+        assert stream.document == dict(document, torrents={})
+        assert response.closed
+
+def test_missing_object(backend):
+    stream = JSONObjectStream(FakeResponse('{"rid": 2, "torrents_removed": ["h1"]}', 7), ['torrents'])
+    assert list(stream) == []
+    assert stream.document == {'rid': 2, 'torrents_removed': ['h1']}
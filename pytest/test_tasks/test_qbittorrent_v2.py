@@ -0,0 +1,232 @@
+import threading
+from autoremovetorrents import logger
+from autoremovetorrents.task import Task
+from autoremovetorrents.clientpool import ClientPool
+from autoremovetorrents.fetcher import ConcurrentFetcher
+
+# Requests sent to the path
+def requests_to(mocker, path):
+    return [request for request in mocker.request_history if request.path == path]
+
+def test_excluded_trackers_use_tracker_list(qbittorrent_v2_mocker, qbittorrent_v2_torrent):
+    logger.Logger.init()
+
+    # The torrent list only reports the working tracker,
+    # while the torrent also belongs to the excluded tracker
+    host = 'http://qbittorrent-v2-trackers'
+    mocker = qbittorrent_v2_mocker(host, [{
+        'rid': 1, 'full_update': True, 'server_state': {},
+        'torrents': {'h1': qbittorrent_v2_torrent('h1', 'Torrent 1', tracker='https://pub.example/announce')},
+    }], trackers={'h1': ['https://priv.example/announce', 'https://pub.example/announce']})
+
+    task = Task('excluded_trackers', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'excluded_trackers': ['priv.example'], 'ratio': 0.5}},
+    }, True)
+    task.execute()
+    assert len(task.get_removed_torrents()) == 0
+    assert len(requests_to(mocker, '/api/v2/torrents/trackers')) == 1
+    assert len(requests_to(mocker, '/api/v2/torrents/delete')) == 0
+
+def test_working_tracker_without_tracker_filters(qbittorrent_v2_mocker, qbittorrent_v2_torrent):
+    logger.Logger.init()
+
+    # The tracker list isn't needed if no strategies select torrents by trackers
+    host = 'http://qbittorrent-v2-working-tracker'
+    mocker = qbittorrent_v2_mocker(host, [{
+        'rid': 1, 'full_update': True, 'server_state': {},
+        'torrents': {'h1': qbittorrent_v2_torrent('h1', 'Torrent 1', tracker='https://pub.example/announce')},
+    }])
+
+    task = Task('working_tracker', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'ratio': 0.5}},
+    }, True)
+    task.execute()
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h1']
+    assert len(requests_to(mocker, '/api/v2/torrents/trackers')) == 0
+
+def test_sync_and_filtered_list(qbittorrent_v2_mocker, qbittorrent_v2_torrent):
+    logger.Logger.init()
+
+    # A full update, and then a partial update with a removed torrent
+    host = 'http://qbittorrent-v2-sync'
+    mocker = qbittorrent_v2_mocker(host, [{
+        'rid': 1, 'full_update': True, 'server_state': {},
+        'torrents': {
+            'h1': qbittorrent_v2_torrent('h1', 'Torrent 1', ratio=1.0),
+            'h2': qbittorrent_v2_torrent('h2', 'Torrent 2', ratio=1.0),
+        },
+    }, {
+        'rid': 2, 'server_state': {},
+        'torrents': {'h1': {'ratio': 6.0}},
+        'torrents_removed': ['h2'],
+    }], torrents_info=[qbittorrent_v2_torrent('h3', 'Torrent 3', category='movies', ratio=6.0)])
+
+    task = Task('sync', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'ratio': 5}},
+    }, False)
+    task.execute()
+    assert set([torrent.hash for torrent in task.get_remaining_torrents()]) == set(['h1', 'h2'])
+    assert len(task.get_removed_torrents()) == 0
+
+    # The next run only receives the changes
+    ClientPool.invalidate_snapshots()
+    task.execute()
+    assert set([torrent.hash for torrent in task.get_remaining_torrents()]) == set(['h1'])
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h1']
+    sync_requests = requests_to(mocker, '/api/v2/sync/maindata')
+    assert [request.qs['rid'] for request in sync_requests] == [['0'], ['1']]
+    # The full update is decoded while it's being received
+    assert [request.stream for request in sync_requests] == [True, False]
+
+    # A strategy of a category makes the server filter the torrents
+    task = Task('filtered', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'categories': 'movies', 'ratio': 5}},
+    }, False)
+    task.execute()
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h3']
+    assert [request.qs for request in requests_to(mocker, '/api/v2/torrents/info')] == [{'category': ['movies']}]
+    assert len(requests_to(mocker, '/api/v2/sync/maindata')) == 2
+
+def test_required_fields_and_filters(qbittorrent_v2_mocker, qbittorrent_v2_torrent):
+    logger.Logger.init()
+
+    # qBittorrent 3.x doesn't report the seeding time in the torrent list,
+    # so the generic properties are requested only if the strategies need them
+    torrents = {}
+    for hash_, category in [('h1', 'movies'), ('h2', 'music')]:
+        torrents[hash_] = qbittorrent_v2_torrent(hash_, hash_, category=category, ratio=6.0)
+        del torrents[hash_]['seeding_time']
+    host = 'http://qbittorrent-v2-fields'
+    mocker = qbittorrent_v2_mocker(host, [{'rid': 1, 'full_update': True, 'server_state': {}, 'torrents': torrents}])
+    mocker.get(host+'/api/v2/torrents/properties', json={
+        'total_uploaded': 1024, 'total_downloaded': 1024, 'addition_date': 1547136801, 'seeding_time': 3600,
+        'up_speed': 0, 'dl_speed': 0, 'seeds_total': 10, 'seeds': 1, 'peers_total': 1, 'peers': 0,
+        'up_speed_avg': 0, 'dl_speed_avg': 0,
+    })
+
+    # Only the ratio is needed
+    task = Task('ratio', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'ratio': 5}},
+    }, False)
+    task.execute()
+    assert len(task.get_removed_torrents()) == 2
+    assert len(requests_to(mocker, '/api/v2/torrents/properties')) == 0
+    assert len(requests_to(mocker, '/api/v2/torrents/trackers')) == 0
+
+    # The seeding time is in the generic properties
+    # Categories with patterns can't be selected by the server
+    ClientPool.invalidate_snapshots()
+    task = Task('seeding_time', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'categories': 'mov*', 'seeding_time': 1800}},
+    }, False)
+    task.execute()
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h1']
+    assert len(requests_to(mocker, '/api/v2/torrents/properties')) == 2
+    assert len(requests_to(mocker, '/api/v2/torrents/info')) == 0
+
+def test_remove_chunks_with_retry(qbittorrent_v2_mocker, qbittorrent_v2_torrent, mocker):
+    logger.Logger.init()
+
+    fetcher = mocker.patch('autoremovetorrents.task.ConcurrentFetcher', wraps=ConcurrentFetcher)
+    host = 'http://qbittorrent-v2-remove'
+    torrents = dict([(hash_, qbittorrent_v2_torrent(hash_, hash_, ratio=6.0)) for hash_ in ['h1', 'h2', 'h3']])
+    mocker = qbittorrent_v2_mocker(host, [{'rid': 1, 'full_update': True, 'server_state': {}, 'torrents': torrents}])
+
+    # The first request to remove h2 fails
+    existing = set(torrents)
+    deleted = []
+    def delete(request, context):
+        hashes = request.text.split('hashes=')[1].split('&')[0].split('%7C')
+        deleted.append(hashes)
+        if hashes == ['h2'] and deleted.count(['h2']) == 1:
+            context.status_code = 500
+        else:
+            existing.difference_update(hashes)
+        return ''
+    def info(request, context):
+        hashes = request.qs['hashes'][0].split('|')
+        return [torrents[hash_] for hash_ in hashes if hash_ in existing]
+    mocker.post(host+'/api/v2/torrents/delete', text=delete)
+    mocker.get(host+'/api/v2/torrents/info', json=info)
+
+    task = Task('remove', {
+        'client': 'qbittorrent', 'host': host, 'remove_chunk_size': 1,
+        'strategies': {'s': {'ratio': 5}},
+    }, True)
+    task.execute()
+    assert len(existing) == 0
+    # Each chunk is removed once, and only the failed one is retried
+    assert sorted(deleted) == [['h1'], ['h2'], ['h2'], ['h3']]
+    assert deleted[-1] == ['h2']
+    # The chunks are removed concurrently
+    assert fetcher.call_args_list[-1][0][0] == 4
+
+def test_strategies_hold_client(qbittorrent_v2_mocker, qbittorrent_v2_torrent, mocker):
+    logger.Logger.init()
+
+    host = 'http://qbittorrent-v2-strategies-lock'
+    qbittorrent_v2_mocker(host, [{
+        'rid': 1, 'full_update': True, 'server_state': {},
+        'torrents': {'h1': qbittorrent_v2_torrent('h1', 'Torrent 1')},
+    }])
+
+    # Other tasks on the host can't use the client while the strategies
+    # load the status and check the torrents
+    available = []
+    def check_client(*args):
+        pooled = ClientPool.get('qbittorrent', host, '')
+        acquire = threading.Thread(target=lambda: available.append(pooled.lock.acquire(False)))
+        acquire.start()
+        acquire.join()
+    mocker.patch('autoremovetorrents.strategy.Strategy.execute', side_effect=check_client)
+
+    Task('strategies_lock', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'ratio': 5}},
+    }, True).execute()
+    assert available == [False]
+
+def test_threads_only_for_requests_per_torrent(qbittorrent_v2_mocker, qbittorrent_v2_torrent, mocker):
+    logger.Logger.init()
+
+    host = 'http://qbittorrent-v2-fetcher'
+    qbittorrent_v2_mocker(host, [{
+        'rid': 1, 'full_update': True, 'server_state': {},
+        'torrents': {'h1': qbittorrent_v2_torrent('h1', 'Torrent 1', tracker='https://pub.example/announce')},
+    }], trackers={'h1': ['https://pub.example/announce']})
+    fetcher = mocker.patch('autoremovetorrents.task.ConcurrentFetcher', wraps=ConcurrentFetcher)
+
+    # The torrents are built from the list
+    Task('bulk', {
+        'client': 'qbittorrent', 'host': host, 'concurrent_requests': 4,
+        'strategies': {'s': {'ratio': 5}},
+    }, False).execute()
+    # The tracker lists are requested for each torrent
+    ClientPool.invalidate_snapshots()
+    Task('trackers', {
+        'client': 'qbittorrent', 'host': host, 'concurrent_requests': 4,
+        'strategies': {'s': {'trackers': ['pub.example'], 'ratio': 5}},
+    }, False).execute()
+    assert [call[0][0] for call in fetcher.call_args_list] == [1, 4]
+
+def test_numeric_categories(qbittorrent_v2_mocker, qbittorrent_v2_torrent):
+    logger.Logger.init()
+
+    # YAML reads the category 2023 as a number, but the server filters by names
+    host = 'http://qbittorrent-v2-numeric-categories'
+    mocker = qbittorrent_v2_mocker(host, [], torrents_info=[
+        qbittorrent_v2_torrent('h1', 'Torrent 1', category='2023', ratio=6.0)])
+    task = Task('numeric_categories', {
+        'client': 'qbittorrent', 'host': host,
+        'strategies': {'s': {'categories': [2023, 'movies'], 'ratio': 5}},
+    }, False)
+    task.execute()
+    assert [torrent.hash for torrent in task.get_removed_torrents()] == ['h1']
+    assert sorted([request.qs['category'] for request in requests_to(mocker, '/api/v2/torrents/info')]) == \
+        [['2023'], ['movies']]
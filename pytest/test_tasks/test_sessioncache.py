@@ -0,0 +1,75 @@
+import os
+import stat
+import time
+import pytest
+from autoremovetorrents import logger
+from autoremovetorrents.task import Task
+from autoremovetorrents.clientpool import ClientPool
+from autoremovetorrents.sessioncache import SessionCache
+from autoremovetorrents.exception.loginfailure import LoginFailure
+
+def test_session_cache_file(tmp_path, mocker):
+    path = str(tmp_path / 'sessions.json')
+
+    # Miss
+    cache = SessionCache(path)
+    assert cache.get('key') is None
+
+    # Hit in the next run, and only the owner can read the file
+    cache.set('key', {'cookies': {'SID': 'abc'}})
+    assert SessionCache(path).get('key') == {'cookies': {'SID': 'abc'}}
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    # Expired
+    now = time.time()
+    mocker.patch('time.time', return_value=now + SessionCache.DEFAULT_TTL + 1)
+    assert SessionCache(path).get('key') is None
+    mocker.stopall()
+
+    # Invalidated
+    cache.invalidate('key')
+    assert SessionCache(path).get('key') is None
+
+    # A broken file is ignored
+    with open(path, 'w') as f:
+        f.write('{')
+    assert SessionCache(path).get('key') is None
+
+# Drop the client logged in by the tasks
+def logout(client, host, username):
+    pooled = ClientPool.get(client, host, username)
+    pooled.discard(pooled.client)
+
+def test_transmission_session_cache(tmp_path, transmission_mocker):
+    logger.Logger.init()
+
+    def handler(method, arguments):
+        if method == 'session-get':
+            return {'version': '3.00', 'rpc-version': 15}
+        return {'torrents': []}
+    host = 'http://transmission-session-cache'
+    mocker = transmission_mocker(host, handler)
+    cache = SessionCache(str(tmp_path / 'sessions.json'))
+    key = SessionCache.key('transmission', host, 'admin')
+    conf = {'client': 'transmission', 'host': host, 'username': 'admin', 'password': 'admin',
+        'strategies': {'s': {'ratio': 5}}}
+
+    # Miss: the session id is obtained by HTTP 409
+    Task('miss', dict(conf), False, cache).execute()
+    assert mocker.request_history[0].headers.get('X-Transmission-Session-Id') is None
+    assert cache.get(key)['session_id'] == 'session-1'
+
+    # Hit: the session id is restored
+    logout('transmission', host, 'admin')
+    mocker.reset_mock()
+    Task('hit', dict(conf), False, cache).execute()
+    assert all([request.headers.get('X-Transmission-Session-Id') == 'session-1'
+        for request in mocker.request_history])
+
+    # Invalidation: wrong credentials are found at login, not in the first torrent-get
+    logout('transmission', host, 'admin')
+    mocker.reset_mock()
+    with pytest.raises(LoginFailure):
+        Task('invalidation', dict(conf, password='wrong'), False, cache).execute()
+    assert cache.get(key) is None
+    assert all([request.json()['method'] == 'session-get' for request in mocker.request_history])
@@ -0,0 +1,152 @@
+import time
+import pytest
+from autoremovetorrents import logger
+from autoremovetorrents.task import Task
+from autoremovetorrents.client.transmission import Transmission
+from autoremovetorrents.exception.remotefailure import RemoteFailure
+
+# The ids requested by each torrent-get
+def requested_ids(mocker):
+    return [request.json()['arguments'].get('ids') for request in mocker.request_history
+        if request.json()['method'] == 'torrent-get']
+
+def test_incremental_refresh(transmission_mocker, mocker):
+    logger.Logger.init()
+
+    torrents = [
+        {'id': 1, 'hashString': 'h1', 'name': 'Torrent 1', 'uploadRatio': 1.0},
+        {'id': 2, 'hashString': 'h2', 'name': 'Torrent 2', 'uploadRatio': 2.0},
+    ]
+    def handler(method, arguments):
+        if method == 'session-get':
+            return {'version': '3.00', 'rpc-version': 15}
+        if arguments.get('ids') == 'recently-active':
+            return {'torrents': [], 'removed': [2]}
+        return {'torrents': torrents}
+    host = 'http://transmission-incremental-refresh'
+    requests_mocker = transmission_mocker(host, handler)
+    client = Transmission(host)
+    client.login('admin', 'admin')
+
+    now = time.time()
+    clock = mocker.patch('time.time', return_value=now)
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2']
+
+    # Refreshed within the window: only the recently active torrents are requested
+    clock.return_value = now + Transmission.RECENTLY_ACTIVE_WINDOW - 1
+    assert sorted(client.torrents_list(['ratio'])) == ['h1']
+
+    # The changes out of the window are lost, so the list is refreshed in full
+    # even if the last full refresh is recent
+    clock.return_value = now + Transmission.RECENTLY_ACTIVE_WINDOW * 2
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2']
+
+    assert requested_ids(requests_mocker) == [None, 'recently-active', None]
+
+def test_error_response(requests_mock):
+    logger.Logger.init()
+
+    host = 'http://transmission-error-response'
+    def rpc(request, context):
+        if request.json()['method'] == 'session-get':
+            return {'result': 'success', 'arguments': {'version': '3.00', 'rpc-version': 15}}
+        return {'arguments': {}, 'result': 'no such method'}
+    requests_mock.post(host+'/transmission/rpc', json=rpc)
+    client = Transmission(host)
+    client.login('admin', 'admin')
+
+    # The reply has no torrents
+    with pytest.raises(RemoteFailure):
+        client.torrents_list()
+
+    # The reply is broken
+    requests_mock.post(host+'/transmission/rpc', text='{"arguments": {"torrents": [{"hashString": "h1"},')
+    with pytest.raises(RemoteFailure):
+        client.torrents_list()
+
+def test_status_requested_when_used(transmission_mocker):
+    logger.Logger.init()
+
+    def handler(method, arguments):
+        if method == 'session-get':
+            return {'version': '3.00', 'rpc-version': 15}
+        if method == 'free-space':
+            return {'path': arguments['path'], 'size-bytes': 1 << 40}
+        return {'torrents': [{'id': 1, 'hashString': 'h1', 'name': 'Torrent 1',
+            'uploadRatio': 1.0, 'totalSize': 1024, 'addedDate': 1547136801}]}
+    def methods(mocker):
+        return [request.json()['method'] for request in mocker.request_history]
+
+    # No strategies use the status
+    host = 'http://transmission-status-skipped'
+    mocker = transmission_mocker(host, handler)
+    Task('status_skipped', {'client': 'transmission', 'host': host, 'username': 'admin', 'password': 'admin',
+        'strategies': {'s': {'ratio': 5}}}, False).execute()
+    assert 'session-stats' not in methods(mocker)
+    assert 'free-space' not in methods(mocker)
+
+    # Only the free space is requested for the strategy
+    mocker.reset_mock()
+    host = 'http://transmission-status-used'
+    mocker = transmission_mocker(host, handler)
+    Task('status_used', {'client': 'transmission', 'host': host, 'username': 'admin', 'password': 'admin',
+        'strategies': {'s': {'remote_free_space': {'min': 1, 'path': '/data', 'action': 'remove-old-seeds'}}}},
+        False).execute()
+    assert methods(mocker).count('free-space') == 1
+    assert 'session-stats' not in methods(mocker)
+
+def test_not_json_response(requests_mock):
+    logger.Logger.init()
+
+    host = 'http://transmission-not-json'
+    def rpc(request, context):
+        if request.json()['method'] == 'session-get':
+            return '{"result": "success", "arguments": {"version": "3.00", "rpc-version": 15}}'
+        return '<html><body>502 Bad Gateway, [nginx]</body></html>'
+    requests_mock.post(host+'/transmission/rpc', text=rpc)
+    client = Transmission(host)
+    client.login('admin', 'admin')
+    with pytest.raises(RemoteFailure):
+        client.torrents_list()
+
+def test_table_format(transmission_mocker, mocker):
+    logger.Logger.init()
+
+    def handler(method, arguments):
+        if method == 'session-get':
+            return {'version': '4.00', 'rpc-version': 17}
+        assert arguments['format'] == 'table'
+        if arguments.get('ids') == 'recently-active':
+            # The columns may come in another order than in the full refresh
+            return {'torrents': [
+                ['uploadRatio', 'name', 'id', 'hashString'],
+                [3.0, 'Torrent 1', 1, 'h1'],
+            ], 'removed': [2]}
+        return {'torrents': [
+            ['hashString', 'id', 'name', 'uploadRatio'],
+            ['h1', 1, 'Torrent 1', 1.0],
+            ['h2', 2, 'Torrent 2', 2.0],
+            ['h3', 3, 'Torrent 3', 0.5],
+        ]}
+    host = 'http://transmission-table-format'
+    requests_mocker = transmission_mocker(host, handler)
+    client = Transmission(host)
+    client.login('admin', 'admin')
+
+    now = time.time()
+    clock = mocker.patch('time.time', return_value=now)
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h2', 'h3']
+    header = client._table_header
+    assert header == ['hashString', 'id', 'name', 'uploadRatio']
+    assert client.torrent_properties('h2').ratio == 2.0
+
+    # The rows of the incremental refresh are reordered to the cached header
+    clock.return_value = now + Transmission.RECENTLY_ACTIVE_WINDOW - 1
+    assert sorted(client.torrents_list(['ratio'])) == ['h1', 'h3']
+    assert client._table_header is header
+    torrent = client.torrent_properties('h1')
+    assert (torrent.hash, torrent.name, torrent.ratio) == ('h1', 'Torrent 1', 3.0)
+    torrent = client.torrent_properties('h3')
+    assert (torrent.hash, torrent.name, torrent.ratio) == ('h3', 'Torrent 3', 0.5)
+
+    assert requested_ids(requests_mocker) == [None, 'recently-active']
@@ -0,0 +1,57 @@
+import pytest
+import requests
+from autoremovetorrents import logger
+from autoremovetorrents.exception.connectionfailure import ConnectionFailure
+from autoremovetorrents.transport import Transport, HTTPSession
+
+# Make a session to the host which is retried twice without waiting
+def session(host, mocker):
+    logger.Logger.init()
+    mocker.patch('time.sleep')
+    Transport.configure(host, 1, 1, 2, 10)
+    return HTTPSession(host)
+
+def test_retry(requests_mock, mocker):
+    host = 'http://transport-retry'
+    requests_mock.get(host+'/list', [{'status_code': 503}, {'status_code': 200, 'text': 'ok'}])
+    close = mocker.spy(requests.Response, 'close')
+
+    # The failed response is closed before retrying
+    response = session(host, mocker).get(host+'/list', stream=True)
+    assert response.text == 'ok'
+    assert requests_mock.call_count == 2
+    assert close.call_count == 1
+
+def test_no_retry_of_non_idempotent_methods(requests_mock, mocker):
+    host = 'http://transport-non-idempotent'
+    requests_mock.post(host+'/remove', status_code=503)
+
+    assert session(host, mocker).post(host+'/remove').status_code == 503
+    assert requests_mock.call_count == 1
+
+def test_timeout(requests_mock, mocker):
+    host = 'http://transport-timeout'
+    requests_mock.get(host+'/list', exc=requests.exceptions.ConnectTimeout)
+
+    # Raised after all the retries
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        session(host, mocker).get(host+'/list')
+    assert requests_mock.call_count == 3
+
+def test_circuit_breaker(requests_mock, mocker):
+    host = 'http://transport-circuit-breaker'
+    requests_mock.get(host+'/list', [{'status_code': 503}] * Transport.CIRCUIT_FAILURES + [{'status_code': 200}])
+    http = session(host, mocker)
+    for _ in range(0, Transport.CIRCUIT_FAILURES):
+        http.get(host+'/list', idempotent=False)
+
+    # The requests are paused after too many failures
+    with pytest.raises(ConnectionFailure):
+        http.get(host+'/list')
+    assert requests_mock.call_count == Transport.CIRCUIT_FAILURES
+
+    # One request is sent after a while, and its success closes the circuit
+    now = Transport.get(host)._open_time
+    mocker.patch('time.time', return_value=now + Transport.CIRCUIT_RESET_TIME)
+    assert http.get(host+'/list').status_code == 200
+    assert http.get(host+'/list').status_code == 200
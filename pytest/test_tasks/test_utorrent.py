@@ -0,0 +1,113 @@
+from autoremovetorrents import logger
+from autoremovetorrents.client.utorrent import uTorrent
+from autoremovetorrents.fetcher import ConcurrentFetcher
+from autoremovetorrents.task import Task
+
+# Requests of the action
+def requests_of(mocker, action):
+    return [request for request in mocker.request_history
+        if request.path == '/gui/' and request.qs.get('action') == [action]]
+
+def test_remove_keeps_required_fields(utorrent_mocker, utorrent_torrent):
+    logger.Logger.init()
+
+    host = 'http://utorrent-remove'
+    mocker = utorrent_mocker(host, [
+        {'build': 46229, 'torrentc': '1', 'torrents': [
+            utorrent_torrent('h1', 'Torrent 1'), utorrent_torrent('h2', 'Torrent 2')]},
+        {'build': 46229, 'torrentc': '2', 'torrentp': [], 'torrentm': ['h1']},
+    ])
+    client = uTorrent(host)
+    client.login('admin', 'admin')
+    assert sorted(client.torrents_list(set(['hash', 'name', 'ratio']))) == ['h1', 'h2']
+
+    # The removal is verified with the torrents list
+    assert client.remove_torrents(['h1'], False) == (['h1'], [])
+    # The properties are still not required
+    assert client.torrent_properties('h2').ratio == 1
+    assert len(requests_of(mocker, 'getprops')) == 0
+
+def test_first_list_and_changes(utorrent_mocker, utorrent_torrent):
+    logger.Logger.init()
+
+    host = 'http://utorrent-changes'
+    mocker = utorrent_mocker(host, [
+        {'build': 46229, 'torrentc': '1', 'torrents': [
+            utorrent_torrent('h1', 'Torrent 1'), utorrent_torrent('h2', 'Torrent 2')]},
+        {'build': 46229, 'torrentc': '2', 'torrentp': [
+            utorrent_torrent('h2', 'Torrent 2', ratio=3000), utorrent_torrent('h3', 'Torrent 3')],
+            'torrentm': ['h1']},
+    ])
+    client = uTorrent(host)
+    client.login('admin', 'admin')
+
+    # The first list is complete
+    assert sorted(client.torrents_list(set(['hash', 'name', 'ratio']))) == ['h1', 'h2']
+    # Then only the changed and removed torrents are returned
+    assert sorted(client.torrents_list(set(['hash', 'name', 'ratio']))) == ['h2', 'h3']
+    assert client.torrent_properties('h2').ratio == 3
+
+    lists = [request.qs for request in mocker.request_history if 'list' in request.qs]
+    assert 'cid' not in lists[0]
+    assert lists[1]['cid'] == ['1']
+
+def test_batched_properties(utorrent_mocker, utorrent_torrent):
+    logger.Logger.init()
+
+    host = 'http://utorrent-getprops'
+    hashes = ['h%d' % i for i in range(0, 10)]
+    mocker = utorrent_mocker(host, [
+        {'build': 46229, 'torrentc': '1', 'torrents': [utorrent_torrent(hash_, hash_) for hash_ in hashes]},
+    ], trackers={'h1': ['http://a/announce', 'http://b/announce']})
+    client = uTorrent(host)
+    client.login('admin', 'admin')
+    client.torrents_list(set(['hash', 'name', 'tracker']))
+
+    # The properties of all the torrents are requested at once
+    assert client.torrent_properties('h1').tracker == ['http://a/announce', 'http://b/announce']
+    for hash_ in hashes:
+        client.torrent_properties(hash_)
+    getprops = requests_of(mocker, 'getprops')
+    assert len(getprops) == 1
+    assert sorted(getprops[0].qs['hash']) == hashes
+
+def test_properties_split_by_url_length(utorrent_mocker, utorrent_torrent, monkeypatch):
+    logger.Logger.init()
+
+    host = 'http://utorrent-getprops-split'
+    hashes = ['h%d' % i for i in range(0, 10)]
+    mocker = utorrent_mocker(host, [
+        {'build': 46229, 'torrentc': '1', 'torrents': [utorrent_torrent(hash_, hash_) for hash_ in hashes]},
+    ])
+    client = uTorrent(host)
+    client.login('admin', 'admin')
+    client.torrents_list(set(['hash', 'name', 'tracker']))
+
+    # Only a few hashes fit in a request
+    monkeypatch.setattr(uTorrent, 'GETPROPS_URL_LENGTH', len(host) + 60)
+    client.torrent_properties('h0')
+    getprops = requests_of(mocker, 'getprops')
+    assert len(getprops) > 1
+    assert all([len(request.url) <= uTorrent.GETPROPS_URL_LENGTH for request in getprops])
+    assert sorted(sum([request.qs['hash'] for request in getprops], [])) == hashes
+
+def test_remove_chunks_one_by_one(utorrent_mocker, utorrent_torrent, mocker):
+    logger.Logger.init()
+
+    # The removal is verified with the cached list, so the chunks are removed one by one
+    host = 'http://utorrent-remove-chunks'
+    utorrent_mocker(host, [
+        {'build': 46229, 'torrentc': '1', 'torrents': [
+            utorrent_torrent('h1', 'Torrent 1', ratio=6000), utorrent_torrent('h2', 'Torrent 2', ratio=6000)]},
+        {'build': 46229, 'torrentc': '2', 'torrentp': [], 'torrentm': []},
+        {'build': 46229, 'torrentc': '3', 'torrentp': [], 'torrentm': ['h1']},
+        {'build': 46229, 'torrentc': '4', 'torrentp': [], 'torrentm': ['h2']},
+    ])
+    fetcher = mocker.patch('autoremovetorrents.task.ConcurrentFetcher', wraps=ConcurrentFetcher)
+    task = Task('remove_chunks', {
+        'client': 'utorrent', 'host': host, 'username': 'admin', 'password': 'admin', 'remove_chunk_size': 1,
+        'strategies': {'s': {'ratio': 5}},
+    }, True)
+    task.execute()
+    assert len(task.get_removed_torrents()) == 2
+    assert fetcher.call_args_list[-1][0][0] == 1
@@ -26,7 +26,7 @@ setup(name = 'autoremove-torrents',
     include_package_data = True,
     zip_safe = True,
     install_requires = [
-        'deluge-client',
+        'deluge-client>=1.8.0,<1.11', # The pipelining in client/deluge.py uses its internals
         'enum34',
         'ply',
         '' if SUPPORT_SHUTIL else 'psutil',